@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
-from DailyRemainder.models import Medicine, Alarm, AlarmOccurrence, DeviceToken
+from DailyRemainder.models import Medicine, Alarm, AlarmOccurrence, DailyAdherence, DeviceToken
+from DailyRemainder.services import adherence
 
 
 class AlarmInline(admin.TabularInline):
@@ -54,6 +56,7 @@ class AlarmAdmin(admin.ModelAdmin):
     ]
     readonly_fields = ['created_at', 'updated_at']
     date_hierarchy = 'start_date'
+    list_select_related = ['medicine__user']
     
     fieldsets = (
         ('Medicine Information', {
@@ -91,14 +94,24 @@ class AlarmAdmin(admin.ModelAdmin):
     user_name.short_description = 'User'
     user_name.admin_order_field = 'medicine__user__email'
     
+    def get_queryset(self, request):
+        """Annotate occurrence counts so the changelist doesn't count per row."""
+        return super().get_queryset(request).with_occurrence_stats()
+    
+    def save_model(self, request, obj, form, change):
+        """Save, then re-point occurrences if the alarm moved to another medicine."""
+        super().save_model(request, obj, form, change)
+        if change and 'medicine' in form.changed_data:
+            obj.sync_occurrence_owner()
+    
     def occurrence_count(self, obj):
         """Display count of occurrences for this alarm."""
-        count = obj.occurrences.count()
         return format_html(
             '<a href="/admin/DailyRemainder/alarmoccurrence/?alarm__id__exact={}">{} occurrences</a>',
-            obj.id, count
+            obj.id, obj.total_occurrences
         )
     occurrence_count.short_description = 'Occurrences'
+    occurrence_count.admin_order_field = 'total_occurrences'
 
 
 @admin.register(AlarmOccurrence)
@@ -108,12 +121,13 @@ class AlarmOccurrenceAdmin(admin.ModelAdmin):
         'id', 'medicine_name', 'user_name', 'scheduled_at',
         'status_badge', 'taken_at'
     ]
-    list_filter = ['status', 'scheduled_at', 'alarm__medicine__user']
+    list_filter = ['status', 'scheduled_at', 'user']
+    list_select_related = ['medicine', 'user']
     search_fields = [
-        'alarm__medicine__name',
-        'alarm__medicine__user__email',
-        'alarm__medicine__user__first_name',
-        'alarm__medicine__user__last_name'
+        'medicine__name',
+        'user__email',
+        'user__first_name',
+        'user__last_name'
     ]
     readonly_fields = ['created_at']
     date_hierarchy = 'scheduled_at'
@@ -133,17 +147,17 @@ class AlarmOccurrenceAdmin(admin.ModelAdmin):
     
     def medicine_name(self, obj):
         """Display medicine name."""
-        return obj.alarm.medicine.name
+        return obj.medicine.name
     medicine_name.short_description = 'Medicine'
-    medicine_name.admin_order_field = 'alarm__medicine__name'
+    medicine_name.admin_order_field = 'medicine__name'
     
     def user_name(self, obj):
         """Display user name or email."""
-        user = obj.alarm.medicine.user
+        user = obj.user
         name = f"{user.first_name} {user.last_name}".strip()
         return name if name else user.email
     user_name.short_description = 'User'
-    user_name.admin_order_field = 'alarm__medicine__user__email'
+    user_name.admin_order_field = 'user__email'
     
     def status_badge(self, obj):
         """Display colored status badge."""
@@ -167,7 +181,8 @@ class AlarmOccurrenceAdmin(admin.ModelAdmin):
     def mark_as_taken(self, request, queryset):
         """Bulk action to mark occurrences as taken."""
         from django.utils import timezone
-        updated = queryset.update(
+        updated = self._update_status(
+            queryset,
             status=AlarmOccurrence.STATUS_TAKEN,
             taken_at=timezone.now()
         )
@@ -176,15 +191,65 @@ class AlarmOccurrenceAdmin(admin.ModelAdmin):
     
     def mark_as_missed(self, request, queryset):
         """Bulk action to mark occurrences as missed."""
-        updated = queryset.update(status=AlarmOccurrence.STATUS_MISSED)
+        updated = self._update_status(queryset, status=AlarmOccurrence.STATUS_MISSED)
         self.message_user(request, f'{updated} occurrences marked as missed.')
     mark_as_missed.short_description = 'Mark selected as Missed'
     
     def mark_as_skipped(self, request, queryset):
         """Bulk action to mark occurrences as skipped."""
-        updated = queryset.update(status=AlarmOccurrence.STATUS_SKIPPED)
+        updated = self._update_status(queryset, status=AlarmOccurrence.STATUS_SKIPPED)
         self.message_user(request, f'{updated} occurrences marked as skipped.')
     mark_as_skipped.short_description = 'Mark selected as Skipped'
+    
+    def save_model(self, request, obj, form, change):
+        """Save, then recount the rollup for the old and new scheduled day."""
+        with transaction.atomic():
+            affected = set()
+            if change:
+                affected = adherence.affected_days(AlarmOccurrence.objects.filter(pk=obj.pk))
+            # The alarm may have been changed; keep the denormalized owner in step
+            obj.medicine_id = obj.alarm.medicine_id
+            obj.user_id = obj.alarm.medicine.user_id
+            super().save_model(request, obj, form, change)
+            affected |= adherence.affected_days(AlarmOccurrence.objects.filter(pk=obj.pk))
+            adherence.refresh_days(affected)
+    
+    def delete_model(self, request, obj):
+        """Delete, then recount the rollup for that day."""
+        self.delete_queryset(request, AlarmOccurrence.objects.filter(pk=obj.pk))
+    
+    def delete_queryset(self, request, queryset):
+        """Bulk delete, then recount the affected DailyAdherence rows."""
+        with transaction.atomic():
+            affected = adherence.affected_days(queryset)
+            super().delete_queryset(request, queryset)
+            adherence.refresh_days(affected)
+    
+    def _update_status(self, queryset, **fields):
+        """Apply a bulk update and recount the affected DailyAdherence rows."""
+        with transaction.atomic():
+            affected = adherence.affected_days(queryset)
+            updated = queryset.update(**fields)
+            adherence.refresh_days(affected)
+        return updated
+
+
+@admin.register(DailyAdherence)
+class DailyAdherenceAdmin(admin.ModelAdmin):
+    """Read-only admin view of the DailyAdherence rollup."""
+    list_display = [
+        'id', 'user', 'alarm', 'date', 'scheduled_count',
+        'taken_count', 'missed_count', 'skipped_count', 'updated_at'
+    ]
+    list_filter = ['date']
+    search_fields = ['user__email', 'alarm__medicine__name']
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(DeviceToken)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DailyremainderConfig(AppConfig):
     name = 'DailyRemainder'
+
+    def ready(self):
+        from DailyRemainder import signals  # noqa: F401
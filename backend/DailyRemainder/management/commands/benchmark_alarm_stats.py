@@ -0,0 +1,138 @@
+"""
+Management command: benchmark_alarm_stats
+
+Compares serializing alarms with AlarmDetailSerializer one stats lookup per
+alarm against Alarm.objects.with_occurrence_stats(), which annotates the
+counts in one grouped query. Synthetic alarms (with occurrences and their
+DailyAdherence rollup) are created inside a transaction that is rolled back
+at the end, so the database is left untouched.
+
+Usage:
+    python manage.py benchmark_alarm_stats                     # 1000 alarms, 30 days
+    python manage.py benchmark_alarm_stats --alarms 5000 --days 90
+    python manage.py benchmark_alarm_stats --repeat 10
+"""
+import random
+import statistics
+import time as timer
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from DailyRemainder.models import Alarm, AlarmOccurrence, Medicine
+from DailyRemainder.serializers import AlarmDetailSerializer
+from DailyRemainder.services.adherence import refresh_rollups
+
+STATUSES = [
+    AlarmOccurrence.STATUS_TAKEN,
+    AlarmOccurrence.STATUS_TAKEN,
+    AlarmOccurrence.STATUS_TAKEN,
+    AlarmOccurrence.STATUS_MISSED,
+    AlarmOccurrence.STATUS_SKIPPED,
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark AlarmDetailSerializer stats with and without queryset annotations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alarms', type=int, default=1000,
+            help='Number of synthetic alarms (default: 1000)'
+        )
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='Days of past occurrences per alarm (default: 30)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Timed runs per strategy (default: 5)'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Random seed so runs are comparable'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        self.stdout.write(
+            f"Seeding {options['alarms']} alarms × {options['days']} days of occurrences …"
+        )
+        try:
+            with transaction.atomic():
+                user = self._seed(rng, options['alarms'], options['days'])
+                self.stdout.write(f"{'strategy':>12} {'queries':>8} {'median ms':>10} {'max ms':>10}")
+                alarms = Alarm.objects.filter(medicine__user=user).select_related('medicine').order_by('id')
+
+                self._report('per-alarm', alarms, options['repeat'])
+                self._report('annotated', alarms.with_occurrence_stats(), options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Done — synthetic data rolled back.'))
+
+    def _seed(self, rng, alarm_count, days, batch_size=5000):
+        user = CustomUser.objects.create(
+            username='bench-alarm-stats',
+            email='bench-alarm-stats@example.invalid',
+            name='Bench Alarm Stats',
+            phone_number='9800000000',
+        )
+        medicine = Medicine.objects.create(user=user, name='Bench Medicine')
+
+        first_day = date.today() - timedelta(days=days)
+        alarms = Alarm.objects.bulk_create([
+            Alarm(
+                medicine=medicine,
+                start_date=first_day,
+                start_time=time(8),
+                end_time=time(20),
+                times_per_day=3,
+                generated_through=date.today(),
+            )
+            for _ in range(alarm_count)
+        ])
+
+        occurrences = []
+        for alarm in alarms:
+            for offset in range(days):
+                day = first_day + timedelta(days=offset)
+                for hour in (8, 14, 20):
+                    occurrences.append(AlarmOccurrence(
+                        alarm=alarm,
+                        medicine=medicine,
+                        user=user,
+                        scheduled_at=timezone.make_aware(datetime.combine(day, time(hour))),
+                        status=rng.choice(STATUSES),
+                    ))
+            if len(occurrences) >= batch_size:
+                AlarmOccurrence.objects.bulk_create(occurrences)
+                occurrences = []
+        AlarmOccurrence.objects.bulk_create(occurrences)
+
+        # bulk_create bypasses the rollup writers, so build it explicitly (untimed)
+        refresh_rollups([alarm.id for alarm in alarms])
+        return user
+
+    def _report(self, label, alarms, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = timer.perf_counter()
+                AlarmDetailSerializer(alarms.all(), many=True).data
+                timings.append((timer.perf_counter() - started) * 1000)
+
+        self.stdout.write(
+            f"{label:>12} {len(queries.captured_queries):>8} "
+            f"{statistics.median(timings):>10.2f} {max(timings):>10.2f}"
+        )
@@ -0,0 +1,137 @@
+"""
+Management command: benchmark_dashboard
+
+Times GET /api/daily-reminder/dashboard/ for one user with a year of dose
+history and reports the p95 against DashboardView's 150 ms target, together
+with the number of queries per request. Synthetic alarms and occurrences are
+created inside a transaction that is rolled back at the end, so the database
+is left untouched.
+
+Usage:
+    python manage.py benchmark_dashboard                       # 10 alarms, 365 days
+    python manage.py benchmark_dashboard --alarms 30 --days 730
+    python manage.py benchmark_dashboard --requests 500
+"""
+import random
+import statistics
+import time as timer
+from datetime import date, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from DailyRemainder.models import Alarm, AlarmOccurrence, Medicine
+from DailyRemainder.services.adherence import refresh_rollups
+from DailyRemainder.services.occurance_generator import generate_occurrences
+
+# Server-time p95 DashboardView is expected to stay under
+P95_TARGET_MS = 150
+
+STATUSES = [
+    AlarmOccurrence.STATUS_TAKEN,
+    AlarmOccurrence.STATUS_TAKEN,
+    AlarmOccurrence.STATUS_TAKEN,
+    AlarmOccurrence.STATUS_MISSED,
+    AlarmOccurrence.STATUS_SKIPPED,
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark dashboard latency against its p95 target'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alarms', type=int, default=10,
+            help='Number of synthetic alarms (default: 10)'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Days of past occurrences per alarm (default: 365)'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Timed dashboard requests (default: 200)'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Random seed so runs are comparable'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        self.stdout.write(
+            f"Seeding {options['alarms']} alarms × {options['days']} days of occurrences …"
+        )
+        try:
+            # Keep synthetic reminders out of the Redis dispatch queue
+            with transaction.atomic(), override_settings(REMINDER_QUEUE_ENABLED=False):
+                user = self._seed(rng, options['alarms'], options['days'])
+                p95 = self._report(user, options['requests'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        style = self.style.SUCCESS if p95 <= P95_TARGET_MS else self.style.ERROR
+        self.stdout.write(style(f"p95 {p95:.2f} ms (target {P95_TARGET_MS} ms) — synthetic data rolled back."))
+
+    def _seed(self, rng, alarm_count, days):
+        user = CustomUser.objects.create(
+            username='bench-dashboard',
+            email='bench-dashboard@example.invalid',
+            name='Bench Dashboard',
+            phone_number='9800000000',
+        )
+        first_day = date.today() - timedelta(days=days)
+        alarms = [
+            Alarm.objects.create(
+                medicine=Medicine.objects.create(user=user, name=f'Bench Medicine {i}'),
+                start_date=first_day,
+                start_time=time(8),
+                end_time=time(20),
+                times_per_day=3,
+                generated_through=date.today() + timedelta(days=1),
+            )
+            for i in range(alarm_count)
+        ]
+        generate_occurrences(alarms, first_day, date.today() + timedelta(days=1))
+
+        # Resolve past doses in bulk, then rebuild the rollup once (untimed)
+        past = AlarmOccurrence.objects.filter(alarm__in=alarms, scheduled_at__lt=timezone.now())
+        by_status = {}
+        for occurrence_id in past.values_list('id', flat=True):
+            by_status.setdefault(rng.choice(STATUSES), []).append(occurrence_id)
+        for status, ids in by_status.items():
+            AlarmOccurrence.objects.filter(id__in=ids).update(status=status)
+        refresh_rollups([alarm.id for alarm in alarms])
+        return user
+
+    def _report(self, user, requests):
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get('/api/daily-reminder/dashboard/')  # warm up
+
+        timings = []
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as queries:
+                started = timer.perf_counter()
+                response = client.get('/api/daily-reminder/dashboard/')
+                timings.append((timer.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"Dashboard returned {response.status_code}: {response.content[:200]!r}")
+
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        self.stdout.write(f"{'queries':>8} {'median ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        self.stdout.write(
+            f"{len(queries.captured_queries):>8} {statistics.median(timings):>10.2f} "
+            f"{p95:>10.2f} {max(timings):>10.2f}"
+        )
+        return p95
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-16 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DailyRemainder', '0002_add_notified_to_alarmoccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alarm',
+            name='generated_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-16 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DailyRemainder', '0003_alarm_generated_through'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alarmoccurrence',
+            name='reminder_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='alarmoccurrence',
+            index=models.Index(condition=models.Q(('reminder_claimed_at__isnull', False)), fields=['reminder_claimed_at'], name='occurrence_reminder_claim_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 6.0.2 on 2026-10-16 18:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+STATUS_COUNTERS = {
+    'scheduled': 'scheduled_count',
+    'taken': 'taken_count',
+    'missed': 'missed_count',
+    'skipped': 'skipped_count',
+}
+
+
+def backfill_daily_adherence(apps, schema_editor):
+    """Build the rollup for existing occurrences from one grouped query."""
+    AlarmOccurrence = apps.get_model('DailyRemainder', 'AlarmOccurrence')
+    DailyAdherence = apps.get_model('DailyRemainder', 'DailyAdherence')
+
+    counts = AlarmOccurrence.objects.annotate(
+        day=TruncDate('scheduled_at'),
+    ).values(
+        'alarm_id', 'alarm__medicine__user_id', 'day',
+    ).annotate(**{
+        field: Count('id', filter=Q(status=status))
+        for status, field in STATUS_COUNTERS.items()
+    }).order_by()
+
+    batch = []
+    for row in counts.iterator():
+        batch.append(DailyAdherence(
+            user_id=row['alarm__medicine__user_id'],
+            alarm_id=row['alarm_id'],
+            date=row['day'],
+            **{field: row[field] for field in STATUS_COUNTERS.values()},
+        ))
+        if len(batch) >= 1000:
+            DailyAdherence.objects.bulk_create(batch)
+            batch = []
+    DailyAdherence.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DailyRemainder', '0004_alarmoccurrence_reminder_claimed_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAdherence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scheduled_count', models.PositiveIntegerField(default=0)),
+                ('taken_count', models.PositiveIntegerField(default=0)),
+                ('missed_count', models.PositiveIntegerField(default=0)),
+                ('skipped_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('alarm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_adherence', to='DailyRemainder.alarm')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_adherence', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date'], name='DailyRemain_user_id_ee3f90_idx')],
+                'unique_together': {('user', 'alarm', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_adherence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-16 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DailyRemainder', '0005_dailyadherence'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alarmoccurrence',
+            name='DailyRemain_status_3e8c64_idx',
+        ),
+        migrations.AddIndex(
+            model_name='alarmoccurrence',
+            index=models.Index(fields=['status', 'scheduled_at', 'notified'], name='occurrence_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alarmoccurrence',
+            index=models.Index(condition=models.Q(('notified', False), ('status', 'scheduled')), fields=['scheduled_at'], name='occurrence_unnotified_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-16 20:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_owner_from_alarm(apps, schema_editor):
+    """Fill medicine/user on existing occurrences from their alarm, in one UPDATE each."""
+    Alarm = apps.get_model('DailyRemainder', 'Alarm')
+    AlarmOccurrence = apps.get_model('DailyRemainder', 'AlarmOccurrence')
+
+    alarms = Alarm.objects.filter(pk=OuterRef('alarm_id'))
+    AlarmOccurrence.objects.update(
+        medicine_id=Subquery(alarms.values('medicine_id')[:1]),
+        user_id=Subquery(alarms.values('medicine__user_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DailyRemainder', '0006_occurrence_scheduler_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alarmoccurrence',
+            name='medicine',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='DailyRemainder.medicine'),
+        ),
+        migrations.AddField(
+            model_name='alarmoccurrence',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alarm_occurrences', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_owner_from_alarm, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='alarmoccurrence',
+            name='medicine',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='DailyRemainder.medicine'),
+        ),
+        migrations.AlterField(
+            model_name='alarmoccurrence',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='alarm_occurrences', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='alarmoccurrence',
+            index=models.Index(fields=['user', 'scheduled_at'], name='occurrence_user_time_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F, Sum
 from django.core.exceptions import ValidationError
 from accounts.models import CustomUser
 
@@ -25,6 +26,26 @@ class Medicine(models.Model):
 # -------------------------
 # Alarm (RULE)
 # -------------------------
+class AlarmQuerySet(models.QuerySet):
+    def with_occurrence_stats(self):
+        """
+        Annotate each alarm with ``total_occurrences``, ``taken_count`` and
+        ``missed_count``, summed from its DailyAdherence rows in the same
+        grouped query, so listing N alarms costs one query instead of N.
+        """
+        return self.annotate(
+            total_occurrences=Sum(
+                F("daily_adherence__scheduled_count")
+                + F("daily_adherence__taken_count")
+                + F("daily_adherence__missed_count")
+                + F("daily_adherence__skipped_count"),
+                default=0,
+            ),
+            taken_count=Sum("daily_adherence__taken_count", default=0),
+            missed_count=Sum("daily_adherence__missed_count", default=0),
+        )
+
+
 class Alarm(models.Model):
     medicine = models.ForeignKey(
         Medicine,
@@ -62,9 +83,14 @@ class Alarm(models.Model):
 
     is_active = models.BooleanField(default=True)
 
+    # Last date whose occurrences have been materialized (rolling horizon)
+    generated_through = models.DateField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AlarmQuerySet.as_manager()
+
     # -------------------------
     # Validation
     # -------------------------
@@ -111,6 +137,18 @@ class Alarm(models.Model):
                     "times_per_day does not fit in time window"
                 )
 
+    def sync_occurrence_owner(self):
+        """
+        Point this alarm's occurrences and DailyAdherence rows at its current
+        medicine and user after ``medicine`` was changed. Returns the number of
+        occurrences updated.
+        """
+        user_id = Medicine.objects.values_list("user_id", flat=True).get(pk=self.medicine_id)
+        self.daily_adherence.exclude(user_id=user_id).update(user_id=user_id)
+        return self.occurrences.exclude(
+            medicine_id=self.medicine_id, user_id=user_id,
+        ).update(medicine_id=self.medicine_id, user_id=user_id)
+
     def __str__(self):
         return f"{self.medicine.name} ({self.times_per_day}x/day)"
 
@@ -137,6 +175,20 @@ class AlarmOccurrence(models.Model):
         related_name="occurrences",
     )
 
+    # Copied from alarm.medicine so per-user queries don't join through
+    # Alarm and Medicine; kept in step by Alarm.sync_occurrence_owner()
+    medicine = models.ForeignKey(
+        Medicine,
+        on_delete=models.CASCADE,
+        related_name="occurrences",
+    )
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="alarm_occurrences",
+        db_index=False,  # leading column of occurrence_user_time_idx
+    )
+
     scheduled_at = models.DateTimeField()
     taken_at = models.DateTimeField(null=True, blank=True)
 
@@ -151,19 +203,98 @@ class AlarmOccurrence(models.Model):
         help_text="True once a push notification has been sent for this occurrence.",
     )
 
+    # Set while a reminder run holds the claim (notified=True, push not yet
+    # confirmed); cleared on delivery or release. A claim older than
+    # REMINDER_CLAIM_LEASE was abandoned by a dead worker and is retaken.
+    reminder_claimed_at = models.DateTimeField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        # Also serves per-alarm lookups and date ranges (alarm, scheduled_at)
         unique_together = ("alarm", "scheduled_at")
         indexes = [
             models.Index(fields=["scheduled_at"]),
-            models.Index(fields=["status"]),
+            # Reminder window / missed-dose sweep: status + scheduled_at range,
+            # with notified in the index so the row isn't read to check it
+            models.Index(
+                fields=["status", "scheduled_at", "notified"],
+                name="occurrence_status_due_idx",
+            ),
+            # Reminder window: only doses still waiting for their push
+            models.Index(
+                fields=["scheduled_at"],
+                name="occurrence_unnotified_idx",
+                condition=models.Q(status="scheduled", notified=False),
+            ),
+            # Reminder claims still in flight, for the expired-lease sweep
+            models.Index(
+                fields=["reminder_claimed_at"],
+                name="occurrence_reminder_claim_idx",
+                condition=models.Q(reminder_claimed_at__isnull=False),
+            ),
+            # A patient's occurrences over a date range, without joins
+            models.Index(
+                fields=["user", "scheduled_at"],
+                name="occurrence_user_time_idx",
+            ),
         ]
 
+    def save(self, *args, **kwargs):
+        # bulk_create() callers set these themselves (see occurance_generator)
+        if self.medicine_id is None:
+            self.medicine_id = self.alarm.medicine_id
+        if self.user_id is None:
+            self.user_id = self.alarm.medicine.user_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.alarm} @ {self.scheduled_at}"
 
 
+# -------------------------
+# Daily Adherence (ROLLUP)
+# -------------------------
+class DailyAdherence(models.Model):
+    """
+    Per-day occurrence counts for one alarm, kept in step with
+    AlarmOccurrence by DailyRemainder.services.adherence so stats endpoints
+    read a handful of rows instead of counting occurrences.
+
+    ``date`` is the scheduled day in the server timezone (TIME_ZONE); each
+    counter holds the occurrences currently in that status.
+    """
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="daily_adherence",
+    )
+
+    alarm = models.ForeignKey(
+        Alarm,
+        on_delete=models.CASCADE,
+        related_name="daily_adherence",
+    )
+
+    date = models.DateField()
+
+    scheduled_count = models.PositiveIntegerField(default=0)
+    taken_count = models.PositiveIntegerField(default=0)
+    missed_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "alarm", "date")
+        indexes = [
+            models.Index(fields=["user", "date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.alarm_id} on {self.date}"
+
+
 # -------------------------
 # Device Token
 # -------------------------
@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
 from DailyRemainder.models import Medicine, Alarm, AlarmOccurrence, DeviceToken
+from DailyRemainder.services import adherence
 
 
 class MedicineSerializer(serializers.ModelSerializer):
@@ -58,7 +60,11 @@ class AlarmSerializer(serializers.ModelSerializer):
 
 
 class AlarmDetailSerializer(AlarmSerializer):
-    """Extended serializer with occurrence count."""
+    """
+    Extended serializer with occurrence count. Serialize querysets built with
+    Alarm.objects.with_occurrence_stats() so the counts come from annotations.
+    """
+    STAT_FIELDS = ('total_occurrences', 'taken_count', 'missed_count')
     total_occurrences = serializers.SerializerMethodField()
     taken_count = serializers.SerializerMethodField()
     missed_count = serializers.SerializerMethodField()
@@ -69,28 +75,45 @@ class AlarmDetailSerializer(AlarmSerializer):
         ]
     
     def get_total_occurrences(self, obj):
-        return obj.occurrences.count()
+        return self._stat(obj, 'total_occurrences')
     
     def get_taken_count(self, obj):
-        return obj.occurrences.filter(status=AlarmOccurrence.STATUS_TAKEN).count()
+        return self._stat(obj, 'taken_count')
     
     def get_missed_count(self, obj):
-        return obj.occurrences.filter(status=AlarmOccurrence.STATUS_MISSED).count()
+        return self._stat(obj, 'missed_count')
+    
+    def _stat(self, obj, name):
+        """
+        Read a stat annotated by Alarm.objects.with_occurrence_stats(). For an
+        alarm loaded without it, fetch all three in one query and keep them
+        on the instance.
+        """
+        if not hasattr(obj, name):
+            stats = Alarm.objects.with_occurrence_stats().values(*self.STAT_FIELDS).get(pk=obj.pk)
+            for field, value in stats.items():
+                setattr(obj, field, value)
+        return getattr(obj, name)
 
 
 class AlarmOccurrenceSerializer(serializers.ModelSerializer):
     """Serializer for AlarmOccurrence model."""
-    medicine_name = serializers.CharField(source='alarm.medicine.name', read_only=True)
-    alarm_id = serializers.IntegerField(source='alarm.id', read_only=True)
+    medicine_name = serializers.CharField(source='medicine.name', read_only=True)
+    alarm_id = serializers.IntegerField(read_only=True)
+    is_virtual = serializers.SerializerMethodField()
     
     class Meta:
         model = AlarmOccurrence
         fields = [
             'id', 'alarm_id', 'medicine_name', 'scheduled_at',
-            'taken_at', 'status', 'created_at'
+            'taken_at', 'status', 'created_at', 'is_virtual'
         ]
         read_only_fields = ['id', 'scheduled_at', 'created_at']
     
+    def get_is_virtual(self, obj):
+        """True for occurrences computed from the alarm rule but not stored yet."""
+        return obj.pk is None
+    
     def validate_status(self, value):
         """Validate status transitions."""
         if self.instance:
@@ -106,11 +129,22 @@ class AlarmOccurrenceSerializer(serializers.ModelSerializer):
         return value
     
     def update(self, instance, validated_data):
-        """Update occurrence and set taken_at if marked as taken."""
+        """
+        Update occurrence and set taken_at if marked as taken. The
+        DailyAdherence rollup moves with the status in the same transaction.
+        """
         if validated_data.get('status') == AlarmOccurrence.STATUS_TAKEN:
             validated_data['taken_at'] = timezone.now()
         
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            # Lock the row so concurrent updates count each transition once
+            old_status = AlarmOccurrence.objects.select_for_update().values_list(
+                'status', flat=True
+            ).get(pk=instance.pk)
+            instance = super().update(instance, validated_data)
+            adherence.record_transition(instance, old_status, instance.status)
+        
+        return instance
 
 
 class DeviceTokenSerializer(serializers.ModelSerializer):
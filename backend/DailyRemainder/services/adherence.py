@@ -0,0 +1,194 @@
+"""
+Keeps the DailyAdherence rollup in step with AlarmOccurrence.
+
+Every write path that adds occurrences or changes their status calls in here
+inside the same transaction as the write:
+
+  * a single status change (the occurrence PATCH endpoints) adjusts the two
+    counters involved with an F() update — record_transition()
+  * a batch of identical changes (the missed-dose sweep, via the
+    occurrences_missed signal) does the same per (alarm, day) —
+    record_bulk_transition()
+  * other bulk writes (generation, alarm resets, admin actions) recount the
+    (alarm, day) pairs they touched — refresh_days()
+
+Recounting is always safe, so refresh_rollups() doubles as the repair tool
+when a rollup is suspected to have drifted.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from DailyRemainder.models import AlarmOccurrence, DailyAdherence
+
+# DailyAdherence counter for each occurrence status
+COUNTER_FIELDS = {
+    AlarmOccurrence.STATUS_SCHEDULED: 'scheduled_count',
+    AlarmOccurrence.STATUS_TAKEN: 'taken_count',
+    AlarmOccurrence.STATUS_MISSED: 'missed_count',
+    AlarmOccurrence.STATUS_SKIPPED: 'skipped_count',
+}
+
+# Rows per bulk INSERT when rebuilding rollups
+BULK_BATCH_SIZE = 1000
+
+
+def rollup_date(scheduled_at):
+    """Rollup day of an occurrence: its date in the server timezone."""
+    return timezone.localtime(scheduled_at).date()
+
+
+def refresh_rollups(alarm_ids, start_date=None, end_date=None):
+    """
+    Recount the rollup rows of ``alarm_ids`` between ``start_date`` and
+    ``end_date`` (inclusive; ``None`` leaves that side open) from
+    AlarmOccurrence, replacing what was stored. Days left without any
+    occurrence lose their row.
+
+    Returns:
+        Number of rollup rows written
+    """
+    alarm_ids = list(alarm_ids)
+    if not alarm_ids:
+        return 0
+
+    occurrences = AlarmOccurrence.objects.filter(alarm_id__in=alarm_ids)
+    rollups = DailyAdherence.objects.filter(alarm_id__in=alarm_ids)
+    if start_date is not None:
+        occurrences = occurrences.filter(scheduled_at__gte=_day_start(start_date))
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date is not None:
+        occurrences = occurrences.filter(scheduled_at__lt=_day_start(end_date + timedelta(days=1)))
+        rollups = rollups.filter(date__lte=end_date)
+
+    with transaction.atomic():
+        # Lock the stored rows before counting: a record_transition() F()
+        # update committing between the count and the delete would otherwise
+        # be lost. Writers left waiting on a row deleted below update nothing
+        # and fall back to their own recount.
+        list(rollups.select_for_update().order_by('id').values_list('id', flat=True))
+
+        counts = occurrences.annotate(
+            day=TruncDate('scheduled_at'),
+        ).values(
+            'alarm_id', 'user_id', 'day',
+        ).annotate(**{
+            field: Count('id', filter=Q(status=status))
+            for status, field in COUNTER_FIELDS.items()
+        }).order_by()
+
+        rows = [
+            DailyAdherence(
+                user_id=row['user_id'],
+                alarm_id=row['alarm_id'],
+                date=row['day'],
+                **{field: row[field] for field in COUNTER_FIELDS.values()},
+            )
+            for row in counts
+        ]
+
+        rollups.delete()
+        DailyAdherence.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+    return len(rows)
+
+
+def refresh_days(keys):
+    """
+    Recount the given ``(alarm_id, date)`` pairs, with one pass per distinct
+    date. Used after bulk writes that may have touched many alarms.
+    """
+    alarms_by_day = defaultdict(set)
+    for alarm_id, day in keys:
+        alarms_by_day[day].add(alarm_id)
+
+    for day, alarm_ids in alarms_by_day.items():
+        refresh_rollups(alarm_ids, day, day)
+
+
+def affected_days(queryset):
+    """The ``(alarm_id, date)`` pairs covered by an AlarmOccurrence queryset."""
+    return set(
+        queryset.annotate(day=TruncDate('scheduled_at'))
+        .values_list('alarm_id', 'day')
+        .order_by()
+        .distinct()
+    )
+
+
+def refresh_occurrences(occurrences):
+    """refresh_days() for in-memory occurrences (anything with alarm_id and scheduled_at)."""
+    refresh_days({
+        (occurrence.alarm_id, rollup_date(occurrence.scheduled_at))
+        for occurrence in occurrences
+    })
+
+
+def record_transition(occurrence, old_status, new_status):
+    """
+    Move one occurrence between counters after its status changed. Call in
+    the transaction that saved the occurrence. Falls back to a recount if the
+    day has no rollup row yet.
+    """
+    if old_status == new_status:
+        return
+
+    day = rollup_date(occurrence.scheduled_at)
+    old_field = COUNTER_FIELDS[old_status]
+    new_field = COUNTER_FIELDS[new_status]
+
+    updated = DailyAdherence.objects.filter(
+        alarm_id=occurrence.alarm_id,
+        date=day,
+    ).update(**{
+        old_field: Greatest(F(old_field) - 1, 0),
+        new_field: F(new_field) + 1,
+        'updated_at': timezone.now(),
+    })
+    if not updated:
+        refresh_rollups([occurrence.alarm_id], day, day)
+
+
+def record_bulk_transition(occurrence_ids, old_status, new_status):
+    """
+    record_transition() for many occurrences that all moved from
+    ``old_status`` to ``new_status``. Pairs sharing a day and a dose count
+    are adjusted with one UPDATE; pairs without a rollup row are recounted.
+    """
+    if old_status == new_status or not occurrence_ids:
+        return
+
+    old_field = COUNTER_FIELDS[old_status]
+    new_field = COUNTER_FIELDS[new_status]
+
+    counts = AlarmOccurrence.objects.filter(
+        id__in=occurrence_ids,
+    ).annotate(
+        day=TruncDate('scheduled_at'),
+    ).values('alarm_id', 'day').annotate(moved=Count('id')).order_by()
+
+    alarms_by_change = defaultdict(list)
+    for row in counts:
+        alarms_by_change[(row['day'], row['moved'])].append(row['alarm_id'])
+
+    missing = set()
+    for (day, moved), alarm_ids in alarms_by_change.items():
+        updated = DailyAdherence.objects.filter(
+            alarm_id__in=alarm_ids,
+            date=day,
+        ).update(**{
+            old_field: Greatest(F(old_field) - moved, 0),
+            new_field: F(new_field) + moved,
+            'updated_at': timezone.now(),
+        })
+        if updated < len(alarm_ids):
+            missing.update((alarm_id, day) for alarm_id in alarm_ids)
+
+    refresh_days(missing)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
@@ -1,73 +1,250 @@
-from datetime import datetime, timedelta, time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
-import pytz
 from DailyRemainder.models import Alarm, AlarmOccurrence
+from DailyRemainder.services import adherence, reminder_queue
+from utils.timezones import get_timezone, localize
 
+# Rows per bulk INSERT when materializing occurrences
+BULK_BATCH_SIZE = 1000
 
-def generate_occurrences_for_alarm(alarm, for_date):
-    """
-    Generate alarm occurrences for a specific date.
-    
-    Args:
-        alarm: Alarm instance
-        for_date: date object for which to generate occurrences
-    
-    Returns:
-        List of AlarmOccurrence objects created
-    """
+
+def is_due_on(alarm, for_date):
+    """Return True if the alarm's rule schedules doses on ``for_date``."""
     if not alarm.is_active:
-        return []
+        return False
 
     # Check date boundaries
     if for_date < alarm.start_date:
-        return []
-    
+        return False
+
     if alarm.end_date and for_date > alarm.end_date:
-        return []
+        return False
 
     # Check custom weekdays (Mon/Wed/Fri patterns)
     if alarm.custom_weekdays:
         # weekday() returns 0=Monday, 6=Sunday
-        if for_date.weekday() not in alarm.custom_weekdays:
-            return []
+        return for_date.weekday() in alarm.custom_weekdays
+
     # Check interval days (only if custom_weekdays not set)
-    elif (for_date - alarm.start_date).days % alarm.interval_days != 0:
+    return (for_date - alarm.start_date).days % alarm.interval_days == 0
+
+
+def scheduled_times(alarm, for_date):
+    """
+    Compute the timezone-aware dose times for an alarm on one date, without
+    touching the database.
+
+    Args:
+        alarm: Alarm instance
+        for_date: date object
+
+    Returns:
+        List of aware datetimes (empty if the alarm is not due that day)
+    """
+    if not is_due_on(alarm, for_date):
         return []
 
     # Handle time window
     start_time = alarm.start_time
-    
+
     # Default to end of day if end_time not specified
     end_time = alarm.end_time if alarm.end_time else time(23, 59, 59)
 
-    # Get timezone
-    tz = pytz.timezone(alarm.timezone)
-    
     # Create datetime objects
     start_dt = datetime.combine(for_date, start_time)
     end_dt = datetime.combine(for_date, end_time)
 
-    occurrences = []
-    
     # Handle single dose per day
     if alarm.times_per_day == 1:
-        scheduled_at = tz.localize(start_dt)
-        obj, _ = AlarmOccurrence.objects.get_or_create(
+        return [localize(start_dt, alarm.timezone)]
+
+    # Multiple doses - distribute evenly
+    delta = (end_dt - start_dt) / (alarm.times_per_day - 1)
+    return [localize(start_dt + delta * i, alarm.timezone) for i in range(alarm.times_per_day)]
+
+
+def build_occurrence(alarm, scheduled_at):
+    """
+    Unsaved AlarmOccurrence with its denormalized medicine/user filled in
+    (bulk_create skips AlarmOccurrence.save()). Load alarms with
+    select_related('medicine') to avoid a query per alarm.
+    """
+    return AlarmOccurrence(
+        alarm=alarm,
+        medicine=alarm.medicine,
+        user_id=alarm.medicine.user_id,
+        scheduled_at=scheduled_at,
+    )
+
+
+def _iter_occurrences(alarm, start_date, end_date):
+    """Yield unsaved AlarmOccurrence objects for one alarm over a date range."""
+    current = max(start_date, alarm.start_date)
+    last = min(end_date, alarm.end_date) if alarm.end_date else end_date
+    while current <= last:
+        for scheduled_at in scheduled_times(alarm, current):
+            yield build_occurrence(alarm, scheduled_at)
+        current += timedelta(days=1)
+
+
+def generate_occurrences(alarms, start_date, end_date, batch_size=BULK_BATCH_SIZE):
+    """
+    Materialize occurrences for many alarms over a date range.
+
+    Dose times are computed in memory and written with one
+    ``bulk_create(ignore_conflicts=True)`` per ``batch_size`` rows; the
+    ``(alarm, scheduled_at)`` unique constraint makes re-runs harmless.
+    Each batch also refreshes its DailyAdherence rollups and is added to the
+    reminder dispatch queue.
+
+    Args:
+        alarms: iterable of Alarm instances (a queryset ``.iterator()`` is fine;
+            select_related('medicine') it)
+        start_date: first date to generate (inclusive)
+        end_date: last date to generate (inclusive)
+        batch_size: rows per INSERT
+
+    Returns:
+        Number of occurrence slots written (including ones that already existed)
+    """
+    pending = []
+    total = 0
+
+    for alarm in alarms:
+        pending.extend(_iter_occurrences(alarm, start_date, end_date))
+
+        if len(pending) >= batch_size:
+            total += _write(pending, batch_size)
+            pending = []
+
+    if pending:
+        total += _write(pending, batch_size)
+
+    return total
+
+
+def _write(occurrences, batch_size):
+    """Insert a batch (skipping existing rows), recount its rollups and queue its reminders."""
+    with transaction.atomic():
+        AlarmOccurrence.objects.bulk_create(occurrences, batch_size=batch_size, ignore_conflicts=True)
+        adherence.refresh_occurrences(occurrences)
+    reminder_queue.enqueue(occurrences)
+    return len(occurrences)
+
+
+def horizon_end(today=None):
+    """Last date that should be materialized: today + OCCURRENCE_HORIZON_DAYS."""
+    today = today or date.today()
+    return today + timedelta(days=getattr(settings, 'OCCURRENCE_HORIZON_DAYS', 2))
+
+
+def needs_top_up(through):
+    """Q matching active alarms whose materialized horizon stops before ``through``."""
+    return (
+        Q(is_active=True)
+        & (Q(generated_through__isnull=True) | Q(generated_through__lt=through))
+        # Alarms that ended before their current horizon have nothing left to add
+        & (Q(end_date__isnull=True) | Q(generated_through__isnull=True) | Q(end_date__gt=F('generated_through')))
+    )
+
+
+def top_up_occurrences(alarms, through, today=None):
+    """
+    Extend each alarm's materialized horizon up to ``through`` and record it
+    in ``Alarm.generated_through``.
+
+    Only the missing days are generated: an alarm already covered through
+    day D resumes at D + 1 (never earlier than today). Alarms resuming on
+    the same day share one bulk pass. Safe to re-run.
+
+    Returns:
+        Number of occurrence slots written
+    """
+    today = today or date.today()
+
+    groups = defaultdict(list)
+    for alarm in alarms:
+        start = today
+        if alarm.generated_through and alarm.generated_through >= today:
+            start = alarm.generated_through + timedelta(days=1)
+        groups[start].append(alarm)
+
+    total = 0
+    for start, group in groups.items():
+        total += generate_occurrences(group, start, through)
+        Alarm.objects.filter(id__in=[alarm.id for alarm in group]).update(generated_through=through)
+        for alarm in group:
+            alarm.generated_through = through
+
+    return total
+
+
+# -------------------------
+# Virtual (lazy) expansion
+# -------------------------
+def expand_occurrences(alarms, start_date, end_date):
+    """
+    Compute the occurrences that fall past each alarm's materialized horizon,
+    without writing them.
+
+    Read endpoints merge these with the stored rows (see merge_occurrences),
+    so the table only needs to hold the next few days plus any occurrence
+    whose status has changed. Returned objects are unsaved (``pk is None``).
+
+    Args:
+        alarms: iterable of Alarm instances (select_related('medicine') for serializing)
+        start_date: first date to expand (inclusive)
+        end_date: last date to expand (inclusive)
+
+    Returns:
+        List of unsaved AlarmOccurrence objects ordered by scheduled_at
+    """
+    virtual = []
+    for alarm in alarms:
+        first = start_date
+        if alarm.generated_through and alarm.generated_through >= first:
+            first = alarm.generated_through + timedelta(days=1)
+        virtual.extend(_iter_occurrences(alarm, first, end_date))
+
+    virtual.sort(key=lambda occurrence: occurrence.scheduled_at)
+    return virtual
+
+
+def merge_occurrences(materialized, virtual):
+    """
+    Combine stored and virtual occurrences ordered by scheduled_at. A stored
+    row always wins over a virtual one for the same (alarm, scheduled_at).
+    """
+    merged = {
+        (occurrence.alarm_id, occurrence.scheduled_at): occurrence
+        for occurrence in virtual
+    }
+    for occurrence in materialized:
+        merged[(occurrence.alarm_id, occurrence.scheduled_at)] = occurrence
+    return sorted(merged.values(), key=lambda occurrence: occurrence.scheduled_at)
+
+
+def materialize_occurrence(alarm, scheduled_at):
+    """
+    Persist a single (possibly virtual) occurrence so its status can change.
+
+    Returns the stored AlarmOccurrence, or None if ``scheduled_at`` is not a
+    dose time of the alarm.
+    """
+    local_date = scheduled_at.astimezone(get_timezone(alarm.timezone)).date()
+    if scheduled_at not in scheduled_times(alarm, local_date):
+        return None
+
+    with transaction.atomic():
+        occurrence, created = AlarmOccurrence.objects.get_or_create(
             alarm=alarm,
             scheduled_at=scheduled_at,
+            defaults={'medicine': alarm.medicine, 'user_id': alarm.medicine.user_id},
         )
-        occurrences.append(obj)
-    else:
-        # Multiple doses - distribute evenly
-        delta = (end_dt - start_dt) / (alarm.times_per_day - 1)
-        
-        for i in range(alarm.times_per_day):
-            scheduled_dt = start_dt + delta * i
-            scheduled_at = tz.localize(scheduled_dt)
-            obj, _ = AlarmOccurrence.objects.get_or_create(
-                alarm=alarm,
-                scheduled_at=scheduled_at,
-            )
-            occurrences.append(obj)
-
-    return occurrences
\ No newline at end of file
+        if created:
+            adherence.refresh_occurrences([occurrence])
+    return occurrence
@@ -0,0 +1,113 @@
+"""
+Due-time queue for reminder notifications, kept in a Redis sorted set.
+
+Every materialized occurrence is added when it is generated, as
+
+    member = "<alarm_id>:<scheduled_at in UTC, ISO 8601>"
+    score  = scheduled_at as a Unix timestamp
+
+so the reminder task can atomically pop exactly the entries that are due
+instead of range-scanning AlarmOccurrence on every run.
+
+The queue is an accelerator, not the source of truth: popped entries are
+re-checked against the database (still SCHEDULED, not yet notified), and a
+periodic database sweep in DailyRemainder.tasks picks up anything the queue
+missed (Redis down at generation time, a worker dying mid-send, …).
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Reminders this far past their time are still sent
+REMINDER_LOOKBEHIND = timedelta(minutes=5)
+
+# Members per ZADD call when enqueuing a large generation batch
+_ENQUEUE_CHUNK = 10000
+
+
+def is_enabled():
+    return getattr(settings, 'REMINDER_QUEUE_ENABLED', True)
+
+
+def member(alarm_id, scheduled_at):
+    """Queue member identifying one occurrence."""
+    return f"{alarm_id}:{scheduled_at.astimezone(dt_timezone.utc).isoformat()}"
+
+
+def parse_member(value):
+    """Inverse of member(): return (alarm_id, scheduled_at)."""
+    if isinstance(value, bytes):
+        value = value.decode()
+    alarm_id, scheduled_at = value.split(':', 1)
+    return int(alarm_id), datetime.fromisoformat(scheduled_at)
+
+
+def enqueue(occurrences):
+    """
+    Add occurrences (anything with ``alarm_id`` and ``scheduled_at``) to the
+    queue. Ones already too old to remind about are skipped; re-adding an
+    entry is a no-op.
+
+    Returns False if the queue is disabled or Redis is unreachable.
+    """
+    if not is_enabled():
+        return False
+
+    not_before = timezone.now() - REMINDER_LOOKBEHIND
+    entries = {
+        member(occurrence.alarm_id, occurrence.scheduled_at): occurrence.scheduled_at.timestamp()
+        for occurrence in occurrences
+        if occurrence.scheduled_at >= not_before
+    }
+    if not entries:
+        return True
+
+    items = list(entries.items())
+    try:
+        client = _redis_client()
+        for start in range(0, len(items), _ENQUEUE_CHUNK):
+            client.zadd(_key(), dict(items[start:start + _ENQUEUE_CHUNK]))
+    except Exception as e:
+        logger.warning("Could not enqueue %d reminder(s): %s", len(entries), e)
+        return False
+    return True
+
+
+def pop_due(due_by):
+    """
+    Atomically remove and return every entry scheduled at or before
+    ``due_by`` as a list of (alarm_id, scheduled_at) pairs.
+
+    Returns None if the queue is disabled or Redis is unreachable, so the
+    caller can fall back to querying the database.
+    """
+    if not is_enabled():
+        return None
+
+    max_score = due_by.timestamp()
+    try:
+        pipe = _redis_client().pipeline(transaction=True)
+        pipe.zrangebyscore(_key(), '-inf', max_score)
+        pipe.zremrangebyscore(_key(), '-inf', max_score)
+        members, _removed = pipe.execute()
+    except Exception as e:
+        logger.warning("Could not read reminder queue: %s", e)
+        return None
+
+    return [parse_member(value) for value in members]
+
+
+def _redis_client():
+    import redis
+    return redis.Redis.from_url(
+        settings.REMINDER_QUEUE_REDIS_URL,
+        socket_connect_timeout=1,
+    )
+
+
+def _key():
+    return getattr(settings, 'REMINDER_QUEUE_KEY', 'reminders:due')
@@ -0,0 +1,20 @@
+from django.dispatch import Signal, receiver
+
+from DailyRemainder.models import AlarmOccurrence
+from DailyRemainder.services import adherence
+
+# Sent by check_missed_occurrences once per swept chunk, inside the chunk's
+# transaction, with ``occurrence_ids``: the AlarmOccurrences it just moved from
+# SCHEDULED to MISSED. Receivers with outside side effects (pushes, caregiver
+# alerts) should defer them with transaction.on_commit().
+occurrences_missed = Signal()
+
+
+@receiver(occurrences_missed)
+def count_missed_occurrences(sender, occurrence_ids, **kwargs):
+    """Move the swept doses from scheduled to missed in the DailyAdherence rollup."""
+    adherence.record_bulk_transition(
+        occurrence_ids,
+        AlarmOccurrence.STATUS_SCHEDULED,
+        AlarmOccurrence.STATUS_MISSED,
+    )
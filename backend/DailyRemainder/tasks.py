@@ -1,28 +1,58 @@
 import logging
-from celery import shared_task
+from collections import defaultdict
+from celery import chord, shared_task
 from datetime import date, timedelta
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
 from django.utils import timezone
 from .models import Alarm, AlarmOccurrence, DeviceToken
-from .services.occurance_generator import generate_occurrences_for_alarm
+from .signals import occurrences_missed
+from .services import adherence, reminder_queue
+from .services.occurance_generator import horizon_end, needs_top_up, top_up_occurrences
+from utils.timezones import local_time_label
 
 logger = logging.getLogger('DailyRemainder.tasks')
 
+# Alarm ids per midnight generation subtask
+GENERATION_SHARD_SIZE = 5000
+
+# Rows fetched per round trip while a shard streams its alarms
+GENERATION_CHUNK_SIZE = 1000
+
+# How far ahead of its time a reminder may go out; matches the beat interval
+REMINDER_LEAD_SECONDS = 30
+
+# How far back the half-hourly missed sweep looks; the nightly full run covers the rest
+MISSED_SWEEP_LOOKBACK = timedelta(days=1)
+
+# Occurrences flipped to MISSED per UPDATE / transaction
+MISSED_SWEEP_CHUNK_SIZE = 1000
+
+# Occurrences claimed for a reminder per UPDATE
+REMINDER_CLAIM_CHUNK_SIZE = 1000
+
+# A claim neither confirmed nor released after this long belongs to a worker
+# that died mid-send; the database sweep takes it over
+REMINDER_CLAIM_LEASE = timedelta(minutes=5)
+
+# How long past its time a reminder from an abandoned claim is still retried
+REMINDER_RETRY_WINDOW = timedelta(minutes=30)
+
 
 def _ensure_firebase():
     """
     Attempt to initialise Firebase if it is not already running.
-    Returns (send_notification, TokenUnregisteredException) or (None, None).
+    Returns send_each_notification, or None if Firebase is unavailable.
     """
     try:
         from utils.firebase import (
-            send_notification,
-            TokenUnregisteredException,
+            send_each_notification,
             is_firebase_available,
             initialize_firebase,
         )
     except ImportError:
         logger.error("Firebase module could not be imported")
-        return None, None
+        return None
 
     if not is_firebase_available():
         logger.info("Firebase not yet initialised — attempting init now …")
@@ -30,175 +60,502 @@ def _ensure_firebase():
 
     if not is_firebase_available():
         logger.error("Firebase initialisation failed — push notifications disabled")
-        return None, None
+        return None
 
-    return send_notification, TokenUnregisteredException
+    return send_each_notification
 
 
 @shared_task(name='DailyRemainder.tasks.generate_daily_occurrences')
-def generate_daily_occurrences():
+def generate_daily_occurrences(for_date=None):
+    """
+    Top up the rolling occurrence horizon for every active alarm.
+    Scheduled: hourly via Celery Beat.
+
+    Each alarm keeps occurrences materialized through today +
+    OCCURRENCE_HORIZON_DAYS (``Alarm.generated_through``). Only alarms whose
+    horizon falls short are touched, so a run right after another is almost
+    free and a missed run is simply caught up by the next one.
+
+    Splits those alarms into id-range shards of GENERATION_SHARD_SIZE and
+    fans them out as a chord, so several workers share the work and
+    summarize_daily_generation reports the combined totals.
+    """
+    for_date = for_date or date.today().isoformat()
+    through = horizon_end(date.fromisoformat(for_date))
+
+    bounds = Alarm.objects.filter(needs_top_up(through)).aggregate(
+        first_id=Min('id'), last_id=Max('id'),
+    )
+    if bounds['first_id'] is None:
+        return f"Generated 0 occurrences for 0 alarms on {for_date}"
+
+    shards = [
+        generate_occurrences_for_shard.s(
+            first_id, min(first_id + GENERATION_SHARD_SIZE - 1, bounds['last_id']), for_date,
+        )
+        for first_id in range(bounds['first_id'], bounds['last_id'] + 1, GENERATION_SHARD_SIZE)
+    ]
+    chord(shards)(summarize_daily_generation.s(for_date))
+
+    logger.info("Dispatched %d occurrence generation shard(s) for %s", len(shards), for_date)
+    return f"Dispatched {len(shards)} generation shards for {for_date}"
+
+
+@shared_task(name='DailyRemainder.tasks.generate_occurrences_for_shard')
+def generate_occurrences_for_shard(first_id, last_id, for_date):
+    """Top up the horizon for alarms with first_id <= id <= last_id that fall short."""
+    today = date.fromisoformat(for_date)
+    through = horizon_end(today)
+    alarms = _Counted(
+        Alarm.objects.filter(needs_top_up(through), id__gte=first_id, id__lte=last_id)
+        .select_related('medicine')
+        .order_by('id')
+        .iterator(chunk_size=GENERATION_CHUNK_SIZE)
+    )
+    total_generated = top_up_occurrences(alarms, through, today=today)
+    return {'alarms': alarms.count, 'occurrences': total_generated}
+
+
+@shared_task(name='DailyRemainder.tasks.regenerate_alarm_occurrences')
+def regenerate_alarm_occurrences(alarm_id, reset=False):
     """
-    Generate alarm occurrences for all active alarms for today.
-    Scheduled: daily at midnight via Celery Beat.
+    Materialize an alarm's occurrences up to the horizon after it is created
+    or edited. Queued by the alarm views so the HTTP response does not wait.
+
+    With ``reset=True`` (alarm edited) every future SCHEDULED occurrence is
+    deleted in one statement first, so doses from the old schedule do not
+    linger, and generation restarts from today.
     """
-    today = date.today()
-    active_alarms = Alarm.objects.filter(is_active=True)
+    try:
+        alarm = Alarm.objects.select_related('medicine').get(id=alarm_id)
+    except Alarm.DoesNotExist:
+        return f"Alarm #{alarm_id} not found"
+
+    deleted = 0
+    if reset:
+        now = timezone.now()
+        with transaction.atomic():
+            deleted, _ = AlarmOccurrence.objects.filter(
+                alarm=alarm,
+                status=AlarmOccurrence.STATUS_SCHEDULED,
+                scheduled_at__gte=now,
+            ).delete()
+            # Days the old schedule no longer covers drop out of the rollup
+            adherence.refresh_rollups([alarm.id], adherence.rollup_date(now))
+        alarm.generated_through = None
+
+    generated = top_up_occurrences([alarm], horizon_end())
+
+    logger.info(
+        "Regenerated alarm %s: removed %d stale, wrote %d occurrence(s)",
+        alarm_id, deleted, generated,
+    )
+    return f"Alarm #{alarm_id}: removed {deleted} stale, generated {generated} occurrences"
+
+
+@shared_task(name='DailyRemainder.tasks.summarize_daily_generation')
+def summarize_daily_generation(results, for_date):
+    """Chord callback: add up the per-shard totals."""
+    total_alarms = sum(result['alarms'] for result in results)
+    total_generated = sum(result['occurrences'] for result in results)
 
-    total_generated = 0
-    for alarm in active_alarms:
-        occurrences = generate_occurrences_for_alarm(alarm, today)
-        total_generated += len(occurrences)
+    logger.info("Generated %d occurrences for %d alarms on %s", total_generated, total_alarms, for_date)
+    return f"Generated {total_generated} occurrences for {total_alarms} alarms on {for_date}"
 
-    logger.info("Generated %d occurrences for %d alarms", total_generated, active_alarms.count())
-    return f"Generated {total_generated} occurrences for {active_alarms.count()} alarms"
+
+class _Counted:
+    """Iterate over ``iterable`` once, counting items as they go past."""
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.count = 0
+
+    def __iter__(self):
+        for item in self.iterable:
+            self.count += 1
+            yield item
 
 
 @shared_task(name='DailyRemainder.tasks.check_missed_occurrences')
-def check_missed_occurrences():
+def check_missed_occurrences(full=False):
     """
     Mark SCHEDULED occurrences as MISSED if they are 30+ minutes past their
     scheduled time AND have already been notified (or are old enough that the
-    notification window has definitely passed).
+    notification window has definitely passed). A reminder claim that was
+    never confirmed does not count as notified.
+
+    Scheduled: every 30 minutes via Celery Beat, looking back
+    MISSED_SWEEP_LOOKBACK over the scheduled_at index. A nightly run with
+    ``full=True`` drops the lower bound to catch anything older.
 
-    Scheduled: every 30 minutes via Celery Beat.
+    Rows are flipped MISSED_SWEEP_CHUNK_SIZE at a time in primary-key order,
+    one transaction per chunk. Each chunk's ids come back from the UPDATE
+    (``RETURNING``) and are sent as one ``occurrences_missed`` signal, which
+    moves the counts in the DailyAdherence rollup.
     """
     now = timezone.now()
 
     # Occurrences that were notified but never acted on — missed after 30 min
     notified_cutoff = now - timedelta(minutes=30)
-    missed_notified = AlarmOccurrence.objects.filter(
-        status=AlarmOccurrence.STATUS_SCHEDULED,
-        notified=True,
-        scheduled_at__lt=notified_cutoff,
-    )
 
     # Occurrences that were NEVER notified and are very old (60 min) —
     # the notification window has long passed; mark missed as a safety net.
     unnotified_cutoff = now - timedelta(minutes=60)
-    missed_unnotified = AlarmOccurrence.objects.filter(
-        status=AlarmOccurrence.STATUS_SCHEDULED,
-        notified=False,
-        scheduled_at__lt=unnotified_cutoff,
-    )
 
-    count_n = missed_notified.update(status=AlarmOccurrence.STATUS_MISSED)
-    count_u = missed_unnotified.update(status=AlarmOccurrence.STATUS_MISSED)
+    window_start = None if full else now - MISSED_SWEEP_LOOKBACK
+
+    count_n = count_u = chunks = 0
+    after_id = 0
+    while True:
+        with transaction.atomic():
+            swept = _mark_missed_chunk(
+                after_id, window_start, notified_cutoff, unnotified_cutoff,
+                MISSED_SWEEP_CHUNK_SIZE,
+            )
+            if swept:
+                occurrences_missed.send(
+                    sender=AlarmOccurrence,
+                    occurrence_ids=[occurrence_id for occurrence_id, _ in swept],
+                )
+
+        chunks += 1
+        notified = sum(1 for _, was_notified in swept if was_notified)
+        count_n += notified
+        count_u += len(swept) - notified
+        if len(swept) < MISSED_SWEEP_CHUNK_SIZE:
+            break
+        after_id = max(occurrence_id for occurrence_id, _ in swept)
+
     total = count_n + count_u
 
     logger.info(
-        "Marked %d occurrences as missed (%d notified, %d unnotified-stale)",
-        total, count_n, count_u,
+        "Marked %d occurrences as missed (%d notified, %d unnotified-stale) in %d chunk(s)%s",
+        total, count_n, count_u, chunks, " [full]" if full else "",
     )
     return f"Marked {total} occurrences as missed"
 
 
+def _mark_missed_chunk(after_id, window_start, notified_cutoff, unnotified_cutoff, limit):
+    """
+    Flip the next ``limit`` overdue occurrences with id > ``after_id`` to
+    MISSED in one statement, dropping any reminder claim still held on
+    them. Returns ``[(id, notified), …]`` for the rows actually changed.
+    """
+    if not _can_update_returning():
+        return _mark_missed_chunk_orm(after_id, window_start, notified_cutoff, unnotified_cutoff, limit)
+
+    table = connection.ops.quote_name(AlarmOccurrence._meta.db_table)
+    adapt = connection.ops.adapt_datetimefield_value
+    window_sql = "AND scheduled_at >= %s" if window_start else ""
+    window_params = [adapt(window_start)] if window_start else []
+
+    sql = f"""
+        UPDATE {table}
+        SET status = %s,
+            notified = (notified = %s AND reminder_claimed_at IS NULL),
+            reminder_claimed_at = NULL
+        WHERE status = %s AND id IN (
+            SELECT id FROM {table}
+            WHERE status = %s AND id > %s {window_sql}
+              AND ((notified = %s AND reminder_claimed_at IS NULL AND scheduled_at < %s)
+                   OR ((notified = %s OR reminder_claimed_at IS NOT NULL) AND scheduled_at < %s))
+            ORDER BY id
+            LIMIT %s
+        )
+        RETURNING id, notified
+    """
+    params = [
+        AlarmOccurrence.STATUS_MISSED, True,
+        AlarmOccurrence.STATUS_SCHEDULED,
+        AlarmOccurrence.STATUS_SCHEDULED, after_id, *window_params,
+        True, adapt(notified_cutoff),
+        False, adapt(unnotified_cutoff),
+        limit,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(occurrence_id, bool(notified)) for occurrence_id, notified in cursor.fetchall()]
+
+
+def _mark_missed_chunk_orm(after_id, window_start, notified_cutoff, unnotified_cutoff, limit):
+    """_mark_missed_chunk() for databases without UPDATE … RETURNING: lock, then update."""
+    overdue = AlarmOccurrence.objects.filter(
+        Q(notified=True, reminder_claimed_at__isnull=True, scheduled_at__lt=notified_cutoff)
+        | (Q(notified=False) | Q(reminder_claimed_at__isnull=False)) & Q(scheduled_at__lt=unnotified_cutoff),
+        status=AlarmOccurrence.STATUS_SCHEDULED,
+        id__gt=after_id,
+    )
+    if window_start:
+        overdue = overdue.filter(scheduled_at__gte=window_start)
+
+    rows = overdue.select_for_update().order_by('id').values_list('id', 'notified', 'reminder_claimed_at')[:limit]
+    swept = [(occurrence_id, notified and claimed_at is None) for occurrence_id, notified, claimed_at in rows]
+    swept_ids = [occurrence_id for occurrence_id, _ in swept]
+    AlarmOccurrence.objects.filter(id__in=swept_ids).update(status=AlarmOccurrence.STATUS_MISSED)
+    AlarmOccurrence.objects.filter(id__in=swept_ids, reminder_claimed_at__isnull=False).update(
+        notified=False, reminder_claimed_at=None,
+    )
+    return swept
+
+
+def _can_update_returning():
+    """UPDATE … RETURNING needs PostgreSQL or SQLite 3.35+."""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
 @shared_task(name='DailyRemainder.tasks.send_reminder_notifications')
-def send_reminder_notifications():
+def send_reminder_notifications(source='queue'):
     """
     Send FCM push notifications for occurrences that:
       • are still SCHEDULED
       • have NOT been notified yet
-      • have a scheduled_at within  [now − 5 min,  now + 10 min]
-
-    The backward look-behind of 5 minutes ensures that if the Celery beat
-    cycle fires slightly *after* the exact scheduled time the occurrence is
-    still picked up.
-
-    Uses the ``notified`` flag on AlarmOccurrence to avoid duplicate pushes.
-    Scheduled: every 2 minutes via Celery Beat.
+      • are due within REMINDER_LEAD_SECONDS, or at most 5 minutes overdue
+
+    With ``source='queue'`` (every 30 seconds via Celery Beat) due entries
+    are popped from the Redis dispatch queue filled at generation time, so
+    no table scan is needed and reminders go out within the lead time.
+    If Redis is unavailable — or with ``source='database'``, which beat
+    runs every 5 minutes as a safety sweep — the same window is read from
+    AlarmOccurrence instead.
+
+    Uses the ``notified`` flag on AlarmOccurrence to avoid duplicate pushes:
+    candidates are claimed by flipping it before anything is sent, so when
+    the queue run and the database sweep overlap only one of them sends
+    each reminder. Claims whose push did not go out are released again;
+    claims left behind by a worker that died mid-send expire after
+    REMINDER_CLAIM_LEASE and are retaken by the database sweep.
     """
-    send_notification, TokenUnregisteredException = _ensure_firebase()
-    if send_notification is None:
+    send_each_notification = _ensure_firebase()
+    if send_each_notification is None:
         return "Firebase unavailable — skipping notifications"
 
     now = timezone.now()
-    window_start = now - timedelta(minutes=5)   # look 5 min into the past
-    window_end = now + timedelta(minutes=10)     # look 10 min into the future
+    window_start = now - reminder_queue.REMINDER_LOOKBEHIND
+    window_end = now + timedelta(seconds=REMINDER_LEAD_SECONDS)
 
-    upcoming = AlarmOccurrence.objects.filter(
-        status=AlarmOccurrence.STATUS_SCHEDULED,
-        notified=False,
-        scheduled_at__gte=window_start,
-        scheduled_at__lte=window_end,
-    ).select_related('alarm__medicine__user')
+    upcoming = None
+    if source == 'queue':
+        upcoming = _due_from_queue(window_start, window_end)
+    if upcoming is None:
+        source = 'database'
+        upcoming = list(_due_occurrences(window_start, window_end))
+        upcoming += _abandoned_claims(now)
 
     logger.info(
-        "Notification window [%s … %s] — %d candidate occurrence(s)",
-        window_start.isoformat(), window_end.isoformat(), upcoming.count(),
+        "Notification window [%s … %s] — %d candidate occurrence(s) from %s",
+        window_start.isoformat(), window_end.isoformat(), len(upcoming), source,
     )
 
-    if not upcoming.exists():
+    # Skip anything another run claimed since the candidates were read
+    claimed = _claim_for_reminder([occurrence.id for occurrence in upcoming])
+    upcoming = [occurrence for occurrence in upcoming if occurrence.id in claimed]
+
+    if not upcoming:
         return "No upcoming occurrences in window"
 
-    notifications_sent = 0
-    stale_tokens_deactivated = 0
+    try:
+        messages, notifications_sent, stale_tokens_deactivated = _push_reminders(
+            upcoming, claimed, send_each_notification,
+        )
+    except Exception:
+        _release_reminder_claims(claimed)
+        raise
+    if not messages:
+        return f"No devices to notify for {len(upcoming)} upcoming occurrences"
 
-    for occurrence in upcoming:
-        user = occurrence.alarm.medicine.user
-        medicine_name = occurrence.alarm.medicine.name
+    result = (
+        f"Sent {notifications_sent} notifications for {len(upcoming)} upcoming occurrences; "
+        f"deactivated {stale_tokens_deactivated} stale tokens"
+    )
+    logger.info(result)
+    return result
 
-        # Format the scheduled time in the alarm's local timezone (e.g. Asia/Kathmandu)
-        import pytz as _pytz
-        alarm_tz = _pytz.timezone(occurrence.alarm.timezone)
-        local_scheduled = occurrence.scheduled_at.astimezone(alarm_tz)
-        scheduled_time = local_scheduled.strftime('%I:%M %p')
 
-        active_tokens = DeviceToken.objects.filter(user=user, is_active=True)
+def _push_reminders(occurrences, claimed, send_each_notification):
+    """
+    Push a reminder for each claimed occurrence to every active device of
+    its user, in FCM batches. Claims that reached no device are released so
+    a later run retries them, and tokens FCM reports as unregistered are
+    deactivated.
 
-        if not active_tokens.exists():
+    Returns ``(messages, sent, stale_tokens_deactivated)``.
+    """
+    # Active tokens for every user in the window, in one query
+    user_ids = {occurrence.user_id for occurrence in occurrences}
+    tokens_by_user = defaultdict(list)
+    for user_id, token in DeviceToken.objects.filter(
+        user_id__in=user_ids, is_active=True,
+    ).values_list('user_id', 'token'):
+        tokens_by_user[user_id].append(token)
+
+    # One message per (occurrence, device); owners[i] is the occurrence of notifications[i]
+    notifications = []
+    owners = []
+    for occurrence in occurrences:
+        user_id = occurrence.user_id
+        medicine_name = occurrence.medicine.name
+
+        tokens = tokens_by_user.get(user_id)
+        if not tokens:
             logger.warning(
                 "No active device tokens for user %s (occurrence %s)",
-                user.id, occurrence.id,
+                user_id, occurrence.id,
             )
             continue
 
-        sent_for_occurrence = False
-
-        for device_token in active_tokens:
-            try:
-                success = send_notification(
-                    token=device_token.token,
-                    title=f"Time for {medicine_name}",
-                    body=f"Your {medicine_name} dose is scheduled at {scheduled_time}. Don't miss it!",
-                    data={
-                        'occurrence_id': str(occurrence.id),
-                        'alarm_id': str(occurrence.alarm.id),
-                        'medicine_name': medicine_name,
-                        'scheduled_at': occurrence.scheduled_at.isoformat(),
-                        'type': 'medication_reminder',
-                    },
-                )
-                if success:
-                    notifications_sent += 1
-                    sent_for_occurrence = True
-                    logger.info(
-                        "Sent notification for occurrence %s → user %s token …%s",
-                        occurrence.id, user.id, device_token.token[-8:],
-                    )
-
-            except TokenUnregisteredException:
-                device_token.is_active = False
-                device_token.save(update_fields=['is_active'])
-                stale_tokens_deactivated += 1
-                logger.warning(
-                    "Deactivated stale token for user %s: …%s",
-                    user.id, device_token.token[-8:],
-                )
+        # Format the scheduled time in the alarm's local timezone (e.g. Asia/Kathmandu)
+        scheduled_time = local_time_label(occurrence.scheduled_at, occurrence.alarm.timezone)
+
+        for token in tokens:
+            notifications.append({
+                'token': token,
+                'title': f"Time for {medicine_name}",
+                'body': f"Your {medicine_name} dose is scheduled at {scheduled_time}. Don't miss it!",
+                'data': {
+                    'occurrence_id': str(occurrence.id),
+                    'alarm_id': str(occurrence.alarm_id),
+                    'medicine_name': medicine_name,
+                    'scheduled_at': occurrence.scheduled_at.isoformat(),
+                    'type': 'medication_reminder',
+                },
+            })
+            owners.append(occurrence.id)
+
+    if not notifications:
+        _release_reminder_claims(claimed)
+        return 0, 0, 0
+
+    # Sent in batches of FCM_BATCH_LIMIT messages per call
+    response = send_each_notification(notifications)
+
+    # Occurrences that reached at least one device stay notified; the rest
+    # are released so the next run retries them
+    notified_ids = {
+        occurrence_id for occurrence_id, ok in zip(owners, response['results']) if ok
+    }
+    _confirm_reminder_claims(notified_ids)
+    _release_reminder_claims(set(claimed) - notified_ids)
 
-            except Exception as e:
-                logger.error(
-                    "Error sending to token …%s: %s",
-                    device_token.token[-8:], str(e),
-                )
+    stale_tokens_deactivated = 0
+    if response['failed_tokens']:
+        stale_tokens_deactivated = DeviceToken.objects.filter(
+            user_id__in=user_ids,
+            token__in=response['failed_tokens'],
+            is_active=True,
+        ).update(is_active=False)
+        logger.warning("Deactivated %d stale token(s)", stale_tokens_deactivated)
 
-        # Mark as notified so we don't send again
-        if sent_for_occurrence:
-            occurrence.notified = True
-            occurrence.save(update_fields=['notified'])
+    return len(notifications), response['success_count'], stale_tokens_deactivated
 
-    result = (
-        f"Sent {notifications_sent} notifications for {upcoming.count()} upcoming occurrences; "
-        f"deactivated {stale_tokens_deactivated} stale tokens"
+
+def _claim_for_reminder(occurrence_ids):
+    """
+    Set ``notified`` and stamp ``reminder_claimed_at`` on those of
+    ``occurrence_ids`` that are still SCHEDULED and either unnotified or
+    held by a claim older than REMINDER_CLAIM_LEASE, and return the set of
+    ids this call took. Rows claimed by a live concurrent run are left out.
+    """
+    now = timezone.now()
+    lease_cutoff = now - REMINDER_CLAIM_LEASE
+    claimed = set()
+    for start in range(0, len(occurrence_ids), REMINDER_CLAIM_CHUNK_SIZE):
+        chunk = occurrence_ids[start:start + REMINDER_CLAIM_CHUNK_SIZE]
+        if _can_update_returning():
+            claimed.update(_claim_chunk(chunk, now, lease_cutoff))
+        else:
+            claimed.update(_claim_chunk_orm(chunk, now, lease_cutoff))
+    return claimed
+
+
+def _claim_chunk(occurrence_ids, now, lease_cutoff):
+    table = connection.ops.quote_name(AlarmOccurrence._meta.db_table)
+    adapt = connection.ops.adapt_datetimefield_value
+    placeholders = ', '.join(['%s'] * len(occurrence_ids))
+    sql = f"""
+        UPDATE {table} SET notified = %s, reminder_claimed_at = %s
+        WHERE id IN ({placeholders}) AND status = %s
+          AND (notified = %s OR reminder_claimed_at < %s)
+        RETURNING id
+    """
+    params = [
+        True, adapt(now),
+        *occurrence_ids, AlarmOccurrence.STATUS_SCHEDULED,
+        False, adapt(lease_cutoff),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [occurrence_id for occurrence_id, in cursor.fetchall()]
+
+
+def _claim_chunk_orm(occurrence_ids, now, lease_cutoff):
+    """_claim_chunk() for databases without UPDATE … RETURNING: lock, then update."""
+    with transaction.atomic():
+        claimable = list(
+            AlarmOccurrence.objects.filter(
+                Q(notified=False) | Q(reminder_claimed_at__lt=lease_cutoff),
+                id__in=occurrence_ids,
+                status=AlarmOccurrence.STATUS_SCHEDULED,
+            ).select_for_update(skip_locked=True).values_list('id', flat=True)
+        )
+        AlarmOccurrence.objects.filter(id__in=claimable).update(notified=True, reminder_claimed_at=now)
+    return claimable
+
+
+def _confirm_reminder_claims(occurrence_ids):
+    """Settle claims whose reminder reached a device; they stay notified."""
+    if occurrence_ids:
+        AlarmOccurrence.objects.filter(id__in=occurrence_ids).update(reminder_claimed_at=None)
+
+
+def _release_reminder_claims(occurrence_ids):
+    """Give claimed occurrences whose reminder was not delivered back to later runs."""
+    if occurrence_ids:
+        AlarmOccurrence.objects.filter(id__in=occurrence_ids).update(notified=False, reminder_claimed_at=None)
+
+
+def _abandoned_claims(now):
+    """
+    Occurrences still held by an expired claim, i.e. whose worker died
+    between claiming and confirming, and recent enough to retry.
+    """
+    return list(AlarmOccurrence.objects.filter(
+        status=AlarmOccurrence.STATUS_SCHEDULED,
+        reminder_claimed_at__lt=now - REMINDER_CLAIM_LEASE,
+        scheduled_at__gte=now - REMINDER_RETRY_WINDOW,
+    ).select_related('alarm', 'medicine'))
+
+
+def _due_occurrences(window_start, window_end):
+    """Occurrences in the window that still need a reminder."""
+    return AlarmOccurrence.objects.filter(
+        status=AlarmOccurrence.STATUS_SCHEDULED,
+        notified=False,
+        scheduled_at__gte=window_start,
+        scheduled_at__lte=window_end,
+    ).select_related('alarm', 'medicine')
+
+
+def _due_from_queue(window_start, window_end):
+    """
+    Pop due entries from the dispatch queue and load the matching
+    occurrences, or return None if the queue is unavailable.
+    """
+    due = reminder_queue.pop_due(window_end)
+    if due is None:
+        return None
+    if not due:
+        return []
+
+    keys = set(due)
+    candidates = _due_occurrences(window_start, window_end).filter(
+        alarm_id__in={alarm_id for alarm_id, _ in keys},
+        scheduled_at__in={scheduled_at for _, scheduled_at in keys},
     )
-    logger.info(result)
-    return result
+    return [
+        occurrence for occurrence in candidates
+        if (occurrence.alarm_id, occurrence.scheduled_at) in keys
+    ]
@@ -1,3 +1,419 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from unittest import mock, skipUnless
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from DailyRemainder import tasks
+from DailyRemainder.models import Alarm, AlarmOccurrence, DailyAdherence, DeviceToken, Medicine
+from DailyRemainder.services.adherence import COUNTER_FIELDS, refresh_rollups, rollup_date
+from DailyRemainder.services.occurance_generator import generate_occurrences, top_up_occurrences
+
+OCCURRENCE_TABLE = AlarmOccurrence._meta.db_table
+
+
+class PatientTestCase(TestCase):
+    """
+    Shared fixture: a patient with one medicine, and an API client logged in
+    as them. Subclasses extend setUpTestData() and add alarms with make_alarm().
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(
+            username='patient',
+            email='patient@example.invalid',
+            name='Patient',
+            phone_number='9800000000',
+        )
+        cls.medicine = Medicine.objects.create(user=cls.user, name='Paracetamol')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @classmethod
+    def make_alarm(cls, **fields):
+        """An alarm for the patient's medicine; one dose a day at 08:00 from today unless overridden."""
+        fields = {
+            'medicine': cls.medicine,
+            'start_date': date.today(),
+            'start_time': time(8),
+            'times_per_day': 1,
+            **fields,
+        }
+        return Alarm.objects.create(**fields)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class SchedulerQueryPlanTests(PatientTestCase):
+    """
+    The reminder, missed-dose and user-facing occurrence queries must reach
+    AlarmOccurrence through an index or the primary key (SEARCH … USING …),
+    never a full table scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = date.today()
+        alarm = cls.make_alarm(
+            start_date=today - timedelta(days=7),
+            end_time=time(20),
+            times_per_day=3,
+            generated_through=today + timedelta(days=1),
+        )
+        DeviceToken.objects.create(user=cls.user, token='plan-token', platform='android')
+
+        now = timezone.now()
+        AlarmOccurrence.objects.bulk_create(
+            [
+                AlarmOccurrence(
+                    alarm=alarm,
+                    medicine=cls.medicine,
+                    user=cls.user,
+                    scheduled_at=timezone.make_aware(datetime.combine(today + timedelta(days=offset), time(hour))),
+                    status=AlarmOccurrence.STATUS_TAKEN if offset < 0 else AlarmOccurrence.STATUS_SCHEDULED,
+                )
+                for offset in range(-7, 2)
+                for hour in (8, 14, 20)
+            ]
+            + [AlarmOccurrence(alarm=alarm, medicine=cls.medicine, user=cls.user, scheduled_at=now + timedelta(seconds=10))]
+        )
+        refresh_rollups([alarm.id])
+
+    def occurrence_plan(self, queries):
+        """EXPLAIN QUERY PLAN lines touching AlarmOccurrence for every captured query."""
+        lines = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if OCCURRENCE_TABLE not in query['sql']:
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                lines.extend(row[-1] for row in cursor.fetchall() if OCCURRENCE_TABLE in row[-1])
+        return lines
+
+    def assertUsesIndex(self, queries, *index_names):
+        """Every AlarmOccurrence lookup is an index search, using one of ``index_names`` if given."""
+        plan = self.occurrence_plan(queries)
+        self.assertTrue(plan, "no AlarmOccurrence query was captured")
+        for line in plan:
+            self.assertTrue(line.startswith('SEARCH'), line)
+            self.assertIn(' USING ', line)
+        if index_names:
+            self.assertTrue(
+                any(f'INDEX {name} ' in line for line in plan for name in index_names),
+                plan,
+            )
+
+    def test_send_reminder_notifications_uses_index(self):
+        send = mock.Mock(return_value={'success_count': 1, 'results': [True], 'failed_tokens': []})
+        with mock.patch.object(tasks, '_ensure_firebase', return_value=send), \
+                CaptureQueriesContext(connection) as queries:
+            tasks.send_reminder_notifications(source='database')
+
+        send.assert_called_once()
+        self.assertUsesIndex(queries, 'occurrence_status_due_idx', 'occurrence_unnotified_idx')
+
+    def test_check_missed_occurrences_uses_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            tasks.check_missed_occurrences()
+
+        self.assertUsesIndex(queries, 'occurrence_status_due_idx')
+
+    def test_full_missed_sweep_uses_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            tasks.check_missed_occurrences(full=True)
+
+        self.assertUsesIndex(queries, 'occurrence_status_due_idx')
+
+    def test_occurrence_list_uses_index(self):
+        today = date.today()
+        for params in ({}, {'date_from': str(today - timedelta(days=3)), 'date_to': str(today)}):
+            with self.subTest(params=params), CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/daily-reminder/occurrences/', params)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertUsesIndex(queries, 'occurrence_user_time_idx')
+
+    def test_occurrence_update_uses_index(self):
+        occurrence = AlarmOccurrence.objects.filter(status=AlarmOccurrence.STATUS_SCHEDULED).first()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/daily-reminder/occurrences/{occurrence.id}/',
+                {'status': AlarmOccurrence.STATUS_TAKEN},
+                format='json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertUsesIndex(queries)
+
+    def test_dashboard_uses_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/daily-reminder/dashboard/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertUsesIndex(queries, 'occurrence_user_time_idx')
+
+
+class AlarmGenerationStatusTests(PatientTestCase):
+    """The generation handle reports readiness from Alarm.generated_through."""
+
+    def test_ready_after_inline_generation_when_broker_is_down(self):
+        with mock.patch.object(tasks.regenerate_alarm_occurrences, 'delay', side_effect=OSError('broker down')), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/daily-reminder/alarms/', {
+                'medicine': self.medicine.id,
+                'start_date': str(date.today()),
+                'start_time': '08:00:00',
+                'times_per_day': 1,
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201, response.json())
+        status_url = response.json()['data']['generation_job']['status_url']
+        status = self.client.get(status_url).json()['data']
+
+        self.assertTrue(status['ready'])
+        self.assertIsNotNone(status['generated_through'])
+        self.assertNotIn('job', status)
+
+
+class DashboardTests(PatientTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.alarm = cls.make_alarm(
+            start_date=date.today() - timedelta(days=1),
+            end_time=time(20),
+            times_per_day=3,
+        )
+        top_up_occurrences([cls.alarm], date.today() + timedelta(days=1))
+
+    def dashboard(self):
+        response = self.client.get('/api/daily-reminder/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_edited_alarm_is_not_counted_twice_before_regeneration(self):
+        before = self.dashboard()
+        self.assertEqual(before['today_scheduled'], 3)
+
+        # Regeneration is queued on commit and never runs here, so the alarm
+        # is left pending (generated_through=None) with today's stored rows
+        response = self.client.put(
+            f'/api/daily-reminder/alarms/{self.alarm.id}/', {'end_time': '21:00:00'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.alarm.refresh_from_db()
+        self.assertIsNone(self.alarm.generated_through)
+
+        after = self.dashboard()
+        self.assertEqual(after['today_scheduled'], before['today_scheduled'])
+        self.assertEqual(after['today_pending'], before['today_pending'])
+
+    def test_pending_alarm_without_stored_rows_counts_virtual_doses(self):
+        AlarmOccurrence.objects.filter(alarm=self.alarm).delete()
+        refresh_rollups([self.alarm.id])
+        Alarm.objects.filter(pk=self.alarm.pk).update(generated_through=None)
+
+        data = self.dashboard()
+        self.assertEqual(data['today_scheduled'], 3)
+        self.assertEqual(data['today_pending'], 3)
+
+    def test_query_count_does_not_grow_with_history(self):
+        with CaptureQueriesContext(connection) as small:
+            self.dashboard()
+
+        today = date.today()
+        alarms = [self.make_alarm(start_date=today - timedelta(days=60), start_time=time(9)) for _ in range(5)]
+        generate_occurrences(alarms, today - timedelta(days=60), today - timedelta(days=1))
+        top_up_occurrences(alarms, today + timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as large:
+            self.dashboard()
+
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+class ReminderClaimTests(PatientTestCase):
+    """Overlapping reminder runs must not push the same occurrence twice."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.alarm = cls.make_alarm(generated_through=date.today())
+        DeviceToken.objects.create(user=cls.user, token='claim-token', platform='android')
+        cls.occurrence = AlarmOccurrence.objects.create(
+            alarm=cls.alarm, scheduled_at=timezone.now() + timedelta(seconds=10),
+        )
+
+    def test_overlapping_run_skips_claimed_occurrence(self):
+        overlapping = []
+
+        def send(notifications):
+            # The database sweep fires while the first run is still sending
+            overlapping.append(tasks.send_reminder_notifications(source='database'))
+            return {'success_count': len(notifications), 'results': [True] * len(notifications), 'failed_tokens': []}
+
+        with mock.patch.object(tasks, '_ensure_firebase', return_value=mock.Mock(side_effect=send)) as firebase:
+            tasks.send_reminder_notifications(source='database')
+
+        self.assertEqual(firebase.return_value.call_count, 1)
+        self.assertEqual(overlapping, ["No upcoming occurrences in window"])
+        self.occurrence.refresh_from_db()
+        self.assertTrue(self.occurrence.notified)
+
+    def test_undelivered_claim_is_released(self):
+        send = mock.Mock(return_value={'success_count': 0, 'results': [False], 'failed_tokens': []})
+        with mock.patch.object(tasks, '_ensure_firebase', return_value=send):
+            tasks.send_reminder_notifications(source='database')
+
+        send.assert_called_once()
+        self.occurrence.refresh_from_db()
+        self.assertFalse(self.occurrence.notified)
+
+    def abandon_claim(self, occurrence, claimed_ago):
+        """Claim ``occurrence`` as a worker that died before confirming or releasing it."""
+        self.assertEqual(tasks._claim_for_reminder([occurrence.id]), {occurrence.id})
+        AlarmOccurrence.objects.filter(id=occurrence.id).update(
+            reminder_claimed_at=timezone.now() - claimed_ago,
+        )
+
+    def test_database_sweep_retakes_expired_claim(self):
+        self.abandon_claim(self.occurrence, tasks.REMINDER_CLAIM_LEASE + timedelta(seconds=1))
+        send = mock.Mock(return_value={'success_count': 1, 'results': [True], 'failed_tokens': []})
+
+        with mock.patch.object(tasks, '_ensure_firebase', return_value=send):
+            tasks.send_reminder_notifications(source='database')
+
+        send.assert_called_once()
+        self.occurrence.refresh_from_db()
+        self.assertTrue(self.occurrence.notified)
+        self.assertIsNone(self.occurrence.reminder_claimed_at)
+
+    def test_live_claim_is_not_retaken(self):
+        self.abandon_claim(self.occurrence, tasks.REMINDER_CLAIM_LEASE - timedelta(seconds=30))
+        send = mock.Mock()
+
+        with mock.patch.object(tasks, '_ensure_firebase', return_value=send):
+            result = tasks.send_reminder_notifications(source='database')
+
+        self.assertEqual(result, "No upcoming occurrences in window")
+        send.assert_not_called()
+
+    def test_missed_sweep_treats_abandoned_claim_as_unnotified(self):
+        for offset, returning in enumerate((True, False)):
+            with self.subTest(update_returning=returning), \
+                    mock.patch.object(tasks, '_can_update_returning', return_value=returning):
+                now = timezone.now() - timedelta(seconds=offset)
+                recent = AlarmOccurrence.objects.create(alarm=self.alarm, scheduled_at=now - timedelta(minutes=40))
+                stale = AlarmOccurrence.objects.create(alarm=self.alarm, scheduled_at=now - timedelta(minutes=70))
+                for occurrence in (recent, stale):
+                    self.abandon_claim(occurrence, timedelta(minutes=30))
+
+                tasks.check_missed_occurrences()
+
+                recent.refresh_from_db()
+                stale.refresh_from_db()
+                self.assertEqual(recent.status, AlarmOccurrence.STATUS_SCHEDULED)
+                self.assertEqual(stale.status, AlarmOccurrence.STATUS_MISSED)
+                self.assertFalse(stale.notified)
+                self.assertIsNone(stale.reminder_claimed_at)
+
+    def test_sync_view_claims_before_sending(self):
+        overlapping = []
+
+        def send(notifications):
+            # A beat run fires while the app's sync is still sending
+            overlapping.append(tasks.send_reminder_notifications(source='database'))
+            return {'success_count': len(notifications), 'results': [True] * len(notifications), 'failed_tokens': []}
+
+        with mock.patch.object(tasks, '_ensure_firebase', return_value=mock.Mock(side_effect=send)) as firebase:
+            response = self.client.post('/api/daily-reminder/sync-notifications/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], {'sent': 1, 'pending': 0})
+        self.assertEqual(firebase.return_value.call_count, 1)
+        self.assertEqual(overlapping, ["No upcoming occurrences in window"])
+
+    def test_sync_view_releases_failed_claims_and_stale_tokens(self):
+        send = mock.Mock(return_value={'success_count': 0, 'results': [False], 'failed_tokens': ['claim-token']})
+
+        with mock.patch.object(tasks, '_ensure_firebase', return_value=send):
+            response = self.client.post('/api/daily-reminder/sync-notifications/')
+
+        self.assertEqual(response.data['data'], {'sent': 0, 'pending': 1})
+        self.occurrence.refresh_from_db()
+        self.assertFalse(self.occurrence.notified)
+        self.assertFalse(DeviceToken.objects.get(token='claim-token').is_active)
+
+
+class AdherenceRollupTests(PatientTestCase):
+    """DailyAdherence always matches a fresh count of AlarmOccurrence."""
+
+    def setUp(self):
+        super().setUp()
+        self.alarm = self.make_alarm(
+            start_date=date.today() - timedelta(days=2),
+            end_time=time(20),
+            times_per_day=3,
+        )
+        generate_occurrences([self.alarm], date.today() - timedelta(days=2), date.today() + timedelta(days=2))
+
+    def assertRollupsMatch(self):
+        expected = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS.values(), 0))
+        for alarm_id, scheduled_at, status in AlarmOccurrence.objects.values_list('alarm_id', 'scheduled_at', 'status'):
+            expected[(alarm_id, rollup_date(scheduled_at))][COUNTER_FIELDS[status]] += 1
+
+        stored = {
+            (row['alarm_id'], row['date']): {field: row[field] for field in COUNTER_FIELDS.values()}
+            for row in DailyAdherence.objects.values('alarm_id', 'date', *COUNTER_FIELDS.values())
+        }
+        self.assertTrue(stored)
+        self.assertEqual(stored, dict(expected))
+
+    def patch_status(self, occurrence, new_status):
+        response = self.client.patch(
+            f'/api/daily-reminder/occurrences/{occurrence.id}/', {'status': new_status}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_generation(self):
+        self.assertEqual(AlarmOccurrence.objects.count(), 15)
+        self.assertRollupsMatch()
+
+    def test_status_transitions(self):
+        first, second = AlarmOccurrence.objects.order_by('scheduled_at')[:2]
+        self.patch_status(first, AlarmOccurrence.STATUS_TAKEN)
+        self.patch_status(second, AlarmOccurrence.STATUS_SKIPPED)
+        self.patch_status(first, AlarmOccurrence.STATUS_MISSED)
+
+        self.assertRollupsMatch()
+
+    def test_transition_without_rollup_row_recounts(self):
+        DailyAdherence.objects.all().delete()
+        self.patch_status(AlarmOccurrence.objects.order_by('scheduled_at').first(), AlarmOccurrence.STATUS_TAKEN)
+
+        # Only the day of the changed occurrence is rebuilt
+        self.assertEqual(DailyAdherence.objects.count(), 1)
+        DailyAdherence.objects.all().delete()
+        refresh_rollups([self.alarm.id])
+        self.assertRollupsMatch()
+
+    def test_missed_sweep(self):
+        tasks.check_missed_occurrences(full=True)
+
+        self.assertTrue(AlarmOccurrence.objects.filter(status=AlarmOccurrence.STATUS_MISSED).exists())
+        self.assertRollupsMatch()
+
+    def test_reset_after_schedule_change(self):
+        Alarm.objects.filter(pk=self.alarm.pk).update(times_per_day=2)
+        tasks.regenerate_alarm_occurrences(self.alarm.id, reset=True)
 
-# Create your tests here.
+        self.assertRollupsMatch()
@@ -11,10 +11,12 @@ urlpatterns = [
     # Alarm endpoints
     path('alarms/', views.AlarmListCreateView.as_view(), name='alarm-list-create'),
     path('alarms/<int:pk>/', views.AlarmDetailView.as_view(), name='alarm-detail'),
+    path('alarms/<int:pk>/generation/', views.AlarmGenerationStatusView.as_view(), name='alarm-generation-status'),
     
     # Occurrence endpoints
     path('occurrences/', views.OccurrenceListView.as_view(), name='occurrence-list'),
     path('occurrences/<int:pk>/', views.OccurrenceUpdateView.as_view(), name='occurrence-update'),
+    path('occurrences/virtual/', views.VirtualOccurrenceUpdateView.as_view(), name='occurrence-virtual-update'),
     
     # Device token endpoints
     path('device-tokens/', views.DeviceTokenRegisterView.as_view(), name='device-token-register'),
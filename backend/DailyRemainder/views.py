@@ -2,15 +2,32 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.utils import timezone
-from django.db.models import Q, Count
-from datetime import datetime, timedelta, date
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from datetime import datetime, time, timedelta, date
+import logging
 
 from utils.response import ResponseMixin
-from DailyRemainder.models import Medicine, Alarm, AlarmOccurrence, DeviceToken
+from DailyRemainder.models import Medicine, Alarm, AlarmOccurrence, DailyAdherence, DeviceToken
 from DailyRemainder.serializers import (
     MedicineSerializer, AlarmSerializer, AlarmDetailSerializer,
     AlarmOccurrenceSerializer, DeviceTokenSerializer, DashboardSerializer
 )
+from DailyRemainder.services.occurance_generator import (
+    expand_occurrences, materialize_occurrence, merge_occurrences
+)
+
+logger = logging.getLogger(__name__)
+
+# Longest date range expanded from alarm rules in one listing
+VIRTUAL_EXPANSION_MAX_DAYS = 90
+
+
+def _day_start(day):
+    """Midnight of ``day`` in the current timezone, for index-friendly date ranges."""
+    return timezone.make_aware(datetime.combine(day, time.min))
 
 
 # -------------------------
@@ -90,45 +107,74 @@ class MedicineDetailView(ResponseMixin, APIView):
 # -------------------------
 # Alarm Views
 # -------------------------
+def _queue_regeneration(alarm_id, reset):
+    """
+    Queue occurrence regeneration once the alarm is committed. Runs inline
+    if the broker is down.
+    """
+    from DailyRemainder.tasks import regenerate_alarm_occurrences
+
+    def queue():
+        try:
+            regenerate_alarm_occurrences.delay(alarm_id, reset)
+        except Exception as e:
+            logger.warning(
+                "Could not queue occurrence generation for alarm #%s (%s) — running inline",
+                alarm_id, e,
+            )
+            regenerate_alarm_occurrences.apply(args=(alarm_id, reset))
+
+    transaction.on_commit(queue)
+
+
+def _generation_handle(request, alarm):
+    """
+    Status handle returned with alarm create/update responses. Readiness is
+    read from Alarm.generated_through, which is set whether the task ran on
+    a worker or inline.
+    """
+    return {
+        'status_url': request.build_absolute_uri(
+            reverse('DailyRemainder:alarm-generation-status', args=[alarm.pk])
+        ),
+    }
+
+
 class AlarmListCreateView(ResponseMixin, APIView):
     """List all alarms or create a new alarm."""
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         """Get all alarms for the authenticated user's medicines."""
-        medicines = Medicine.objects.filter(user=request.user)
-        alarms = Alarm.objects.filter(medicine__in=medicines).select_related('medicine').order_by('-created_at')
+        alarms = Alarm.objects.filter(medicine__user=request.user).select_related('medicine').order_by('-created_at')
         
         # Filter by active status if requested
         is_active = request.query_params.get('is_active')
         if is_active is not None:
             alarms = alarms.filter(is_active=is_active.lower() == 'true')
         
-        serializer = AlarmSerializer(alarms, many=True)
+        # Occurrence counts for every alarm, annotated in the same query
+        if request.query_params.get('include_stats', '').lower() == 'true':
+            serializer = AlarmDetailSerializer(alarms.with_occurrence_stats(), many=True)
+        else:
+            serializer = AlarmSerializer(alarms, many=True)
         return self.success_response(
             data=serializer.data,
             message="Alarms retrieved successfully"
         )
     
     def post(self, request):
-        """Create a new alarm and generate occurrences for the date range."""
+        """Create a new alarm and generate occurrences for the upcoming horizon."""
         serializer = AlarmSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             alarm = serializer.save()
 
-            # Generate occurrences immediately for today through end_date (or +7 days)
-            from datetime import date as _date, timedelta as _td
-            from DailyRemainder.services.occurance_generator import generate_occurrences_for_alarm
-
-            today = _date.today()
-            end = alarm.end_date if alarm.end_date else today + _td(days=7)
-            current = today
-            while current <= end:
-                generate_occurrences_for_alarm(alarm, current)
-                current += _td(days=1)
+            # Materialize occurrences up to the rolling horizon in the
+            # background; the hourly top-up task extends it from there
+            _queue_regeneration(alarm.id, reset=False)
 
             return self.success_response(
-                data=serializer.data,
+                data={**serializer.data, 'generation_job': _generation_handle(request, alarm)},
                 message="Alarm created successfully",
                 status_code=status.HTTP_201_CREATED
             )
@@ -139,10 +185,13 @@ class AlarmDetailView(ResponseMixin, APIView):
     """Retrieve, update or deactivate an alarm."""
     permission_classes = [IsAuthenticated]
     
-    def get_object(self, pk, user):
+    def get_object(self, pk, user, with_stats=False):
         """Get alarm object if it belongs to the user's medicine."""
+        alarms = Alarm.objects.select_related('medicine')
+        if with_stats:
+            alarms = alarms.with_occurrence_stats()
         try:
-            return Alarm.objects.select_related('medicine').get(
+            return alarms.get(
                 pk=pk,
                 medicine__user=user
             )
@@ -151,7 +200,7 @@ class AlarmDetailView(ResponseMixin, APIView):
     
     def get(self, request, pk):
         """Get alarm details with statistics."""
-        alarm = self.get_object(pk, request.user)
+        alarm = self.get_object(pk, request.user, with_stats=True)
         if not alarm:
             return self.not_found_response("Alarm not found")
         
@@ -164,23 +213,21 @@ class AlarmDetailView(ResponseMixin, APIView):
         if not alarm:
             return self.not_found_response("Alarm not found")
         
+        previous_medicine_id = alarm.medicine_id
         serializer = AlarmSerializer(alarm, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             alarm = serializer.save()
+            if alarm.medicine_id != previous_medicine_id:
+                alarm.sync_occurrence_owner()
 
-            # Re-generate future occurrences after update
-            from datetime import date as _date, timedelta as _td
-            from DailyRemainder.services.occurance_generator import generate_occurrences_for_alarm
-
-            today = _date.today()
-            end = alarm.end_date if alarm.end_date else today + _td(days=7)
-            current = today
-            while current <= end:
-                generate_occurrences_for_alarm(alarm, current)
-                current += _td(days=1)
+            # Replace future occurrences with the new schedule in the background.
+            # Clearing generated_through marks the alarm as pending until then.
+            Alarm.objects.filter(pk=alarm.pk).update(generated_through=None)
+            alarm.generated_through = None
+            _queue_regeneration(alarm.id, reset=True)
 
             return self.success_response(
-                data=serializer.data,
+                data={**serializer.data, 'generation_job': _generation_handle(request, alarm)},
                 message="Alarm updated successfully"
             )
         return self.validation_error_response(errors=serializer.errors)
@@ -196,6 +243,25 @@ class AlarmDetailView(ResponseMixin, APIView):
         return self.success_response(message="Alarm deactivated successfully")
 
 
+class AlarmGenerationStatusView(ResponseMixin, APIView):
+    """Report whether an alarm's occurrences have been materialized yet."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        """Get generation status."""
+        try:
+            alarm = Alarm.objects.get(pk=pk, medicine__user=request.user)
+        except Alarm.DoesNotExist:
+            return self.not_found_response("Alarm not found")
+
+        data = {
+            'alarm_id': alarm.id,
+            'ready': alarm.generated_through is not None,
+            'generated_through': alarm.generated_through,
+        }
+        return self.success_response(data=data)
+
+
 # -------------------------
 # Occurrence Views
 # -------------------------
@@ -205,10 +271,9 @@ class OccurrenceListView(ResponseMixin, APIView):
     
     def get(self, request):
         """Get occurrences for the authenticated user."""
-        medicines = Medicine.objects.filter(user=request.user)
         occurrences = AlarmOccurrence.objects.filter(
-            alarm__medicine__in=medicines
-        ).select_related('alarm__medicine').order_by('scheduled_at')
+            user=request.user
+        ).select_related('medicine').order_by('scheduled_at')
         
         # Filter by date range
         date_from = request.query_params.get('date_from')
@@ -217,7 +282,7 @@ class OccurrenceListView(ResponseMixin, APIView):
         if date_from:
             try:
                 date_from_dt = datetime.strptime(date_from, '%Y-%m-%d').date()
-                occurrences = occurrences.filter(scheduled_at__date__gte=date_from_dt)
+                occurrences = occurrences.filter(scheduled_at__gte=_day_start(date_from_dt))
             except ValueError:
                 return self.validation_error_response(
                     errors="Invalid date_from format. Use YYYY-MM-DD"
@@ -226,7 +291,9 @@ class OccurrenceListView(ResponseMixin, APIView):
         if date_to:
             try:
                 date_to_dt = datetime.strptime(date_to, '%Y-%m-%d').date()
-                occurrences = occurrences.filter(scheduled_at__date__lte=date_to_dt)
+                occurrences = occurrences.filter(
+                    scheduled_at__lt=_day_start(date_to_dt + timedelta(days=1))
+                )
             except ValueError:
                 return self.validation_error_response(
                     errors="Invalid date_to format. Use YYYY-MM-DD"
@@ -239,7 +306,33 @@ class OccurrenceListView(ResponseMixin, APIView):
         
         # Default to today if no filters
         if not date_from and not date_to:
-            occurrences = occurrences.filter(scheduled_at__date=date.today())
+            occurrences = occurrences.filter(
+                scheduled_at__gte=_day_start(date.today()),
+                scheduled_at__lt=_day_start(date.today() + timedelta(days=1)),
+            )
+        
+        # Days past each alarm's materialized horizon are expanded on the fly
+        # (never in the past, and at most VIRTUAL_EXPANSION_MAX_DAYS at once)
+        if not status_param or status_param == AlarmOccurrence.STATUS_SCHEDULED:
+            today = date.today()
+            expand_from = max(date_from_dt, today) if date_from else today
+            if date_to:
+                expand_to = date_to_dt
+            elif date_from:
+                expand_to = expand_from + timedelta(days=VIRTUAL_EXPANSION_MAX_DAYS)
+            else:
+                expand_to = today
+            expand_to = min(expand_to, expand_from + timedelta(days=VIRTUAL_EXPANSION_MAX_DAYS))
+
+            alarms = Alarm.objects.filter(
+                medicine__user=request.user,
+                is_active=True,
+            ).select_related('medicine')
+            virtual = [
+                occurrence for occurrence in expand_occurrences(alarms, expand_from, expand_to)
+                if expand_from <= timezone.localtime(occurrence.scheduled_at).date() <= expand_to
+            ]
+            occurrences = merge_occurrences(occurrences, virtual)
         
         serializer = AlarmOccurrenceSerializer(occurrences, many=True)
         return self.success_response(
@@ -255,9 +348,9 @@ class OccurrenceUpdateView(ResponseMixin, APIView):
     def get_object(self, pk, user):
         """Get occurrence if it belongs to user's medicine."""
         try:
-            return AlarmOccurrence.objects.select_related('alarm__medicine').get(
+            return AlarmOccurrence.objects.select_related('medicine').get(
                 pk=pk,
-                alarm__medicine__user=user
+                user=user
             )
         except AlarmOccurrence.DoesNotExist:
             return None
@@ -282,6 +375,59 @@ class OccurrenceUpdateView(ResponseMixin, APIView):
         return self.validation_error_response(errors=serializer.errors)
 
 
+class VirtualOccurrenceUpdateView(ResponseMixin, APIView):
+    """
+    Update the status of an occurrence that has not been stored yet.
+
+    Occurrences past the materialized horizon are listed with ``id: null``
+    and ``is_virtual: true``; they are identified by alarm and dose time and
+    only written to the database when their status changes.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request):
+        """Persist the occurrence, then apply the status update."""
+        alarm_id = request.data.get('alarm_id')
+        scheduled_at = parse_datetime(str(request.data.get('scheduled_at', '')))
+        if not alarm_id or scheduled_at is None:
+            return self.validation_error_response(
+                errors="alarm_id and scheduled_at (ISO 8601) are required"
+            )
+
+        try:
+            alarm = Alarm.objects.select_related('medicine').get(
+                pk=alarm_id,
+                medicine__user=request.user
+            )
+        except (Alarm.DoesNotExist, ValueError):
+            return self.not_found_response("Alarm not found")
+
+        if timezone.is_naive(scheduled_at):
+            scheduled_at = timezone.make_aware(scheduled_at)
+
+        with transaction.atomic():
+            occurrence = materialize_occurrence(alarm, scheduled_at)
+            if occurrence is None:
+                return self.validation_error_response(
+                    errors="scheduled_at is not a dose time of this alarm"
+                )
+
+            serializer = AlarmOccurrenceSerializer(
+                occurrence,
+                data=request.data,
+                partial=True
+            )
+            if serializer.is_valid():
+                serializer.save()
+                return self.success_response(
+                    data=serializer.data,
+                    message="Occurrence updated successfully"
+                )
+            # Don't keep a row for a rejected update
+            transaction.set_rollback(True)
+        return self.validation_error_response(errors=serializer.errors)
+
+
 # -------------------------
 # Device Token Views
 # -------------------------
@@ -342,73 +488,47 @@ class SyncNotificationsView(ResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        from datetime import timedelta as _td
-        from utils.firebase import send_notification, TokenUnregisteredException, is_firebase_available, initialize_firebase
+        from DailyRemainder.tasks import (
+            _claim_for_reminder, _ensure_firebase, _push_reminders, _release_reminder_claims,
+        )
 
-        if not is_firebase_available():
-            initialize_firebase()
-        if not is_firebase_available():
+        send_each_notification = _ensure_firebase()
+        if send_each_notification is None:
             return self.error_response(message="Push notification service unavailable")
 
         now = timezone.now()
-        window_start = now - _td(minutes=5)
-        window_end = now + _td(minutes=10)
-
         user = request.user
-        upcoming = AlarmOccurrence.objects.filter(
-            alarm__medicine__user=user,
+        due = AlarmOccurrence.objects.filter(
+            user=user,
             status=AlarmOccurrence.STATUS_SCHEDULED,
             notified=False,
-            scheduled_at__gte=window_start,
-            scheduled_at__lte=window_end,
-        ).select_related('alarm__medicine')
+            scheduled_at__gte=now - timedelta(minutes=5),
+            scheduled_at__lte=now + timedelta(minutes=10),
+        )
 
-        active_tokens = DeviceToken.objects.filter(user=user, is_active=True)
-        if not active_tokens.exists():
+        if not DeviceToken.objects.filter(user=user, is_active=True).exists():
             return self.success_response(
-                data={'sent': 0, 'pending': upcoming.count()},
+                data={'sent': 0, 'pending': due.count()},
                 message="No active device tokens registered",
             )
 
+        # Claimed like the scheduled reminder task, so an overlapping beat
+        # run and this sync never push the same dose twice
+        upcoming = list(due.select_related('alarm', 'medicine'))
+        claimed = _claim_for_reminder([occ.id for occ in upcoming])
+        upcoming = [occ for occ in upcoming if occ.id in claimed]
+
         sent = 0
-        for occ in upcoming:
-            medicine_name = occ.alarm.medicine.name
-            # Use the alarm's local timezone for the displayed time
-            import pytz as _pytz
-            alarm_tz = _pytz.timezone(occ.alarm.timezone)
-            local_scheduled = occ.scheduled_at.astimezone(alarm_tz)
-            scheduled_time = local_scheduled.strftime('%I:%M %p')
-
-            ok = False
-            for dt in active_tokens:
-                try:
-                    success = send_notification(
-                        token=dt.token,
-                        title=f"Time for {medicine_name}",
-                        body=f"Your {medicine_name} dose is scheduled at {scheduled_time}. Don't miss it!",
-                        data={
-                            'occurrence_id': str(occ.id),
-                            'alarm_id': str(occ.alarm.id),
-                            'medicine_name': medicine_name,
-                            'scheduled_at': occ.scheduled_at.isoformat(),
-                            'type': 'medication_reminder',
-                        },
-                    )
-                    if success:
-                        ok = True
-                        sent += 1
-                except TokenUnregisteredException:
-                    dt.is_active = False
-                    dt.save(update_fields=['is_active'])
-                except Exception:
-                    pass
-
-            if ok:
-                occ.notified = True
-                occ.save(update_fields=['notified'])
+        if upcoming:
+            try:
+                _, sent, _ = _push_reminders(upcoming, claimed, send_each_notification)
+            except Exception:
+                _release_reminder_claims(claimed)
+                logger.exception("Reminder sync failed for user %s", user.id)
+                return self.error_response(message="Could not send notifications")
 
         return self.success_response(
-            data={'sent': sent, 'pending': upcoming.count()},
+            data={'sent': sent, 'pending': due.count()},
             message=f"Sent {sent} notification(s)",
         )
 
@@ -417,7 +537,16 @@ class SyncNotificationsView(ResponseMixin, APIView):
 # Dashboard View
 # -------------------------
 class DashboardView(ResponseMixin, APIView):
-    """Get user's medication adherence dashboard."""
+    """
+    Get user's medication adherence dashboard.
+
+    The mobile app opens on this screen, so it is the most-hit endpoint in
+    this app. Latency target: p95 under 150 ms server time, measured by the
+    ``benchmark_dashboard`` management command. Occurrence stats
+    and the streak are read from the DailyAdherence rollup (one row per alarm
+    per day) rather than counted from AlarmOccurrence; the other queries are
+    the active alarms, the medicine count and upcoming doses.
+    """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
@@ -428,96 +557,128 @@ class DashboardView(ResponseMixin, APIView):
         # Total medicines
         total_medicines = medicines.count()
         
-        # Active alarms
-        active_alarms = Alarm.objects.filter(
-            medicine__in=medicines,
-            is_active=True
-        ).count()
+        # Active alarms (also used to expand doses past the materialized horizon)
+        alarms = list(Alarm.objects.filter(
+            medicine__user=user,
+            is_active=True,
+        ).select_related('medicine'))
+        active_alarms = len(alarms)
         
-        # Today's occurrences
+        # Day boundaries in the current timezone (rollup days use the same one)
         today = date.today()
-        today_occurrences = AlarmOccurrence.objects.filter(
-            alarm__medicine__in=medicines,
-            scheduled_at__date=today
-        )
+        today_start = timezone.make_aware(datetime.combine(today, time.min))
+        tomorrow_start = today_start + timedelta(days=1)
+        thirty_days_ago = today - timedelta(days=30)
         
-        today_scheduled = today_occurrences.count()
-        today_taken = today_occurrences.filter(status=AlarmOccurrence.STATUS_TAKEN).count()
-        today_missed = today_occurrences.filter(status=AlarmOccurrence.STATUS_MISSED).count()
-        today_pending = today_occurrences.filter(status=AlarmOccurrence.STATUS_SCHEDULED).count()
+        # Today / all-time / last-30-days counts in one query over the rollup
+        is_today = Q(date=today)
+        is_recent = Q(date__gte=thirty_days_ago, date__lte=today)
+        stats = DailyAdherence.objects.filter(user=user).aggregate(
+            today_pending=Sum('scheduled_count', filter=is_today, default=0),
+            today_taken=Sum('taken_count', filter=is_today, default=0),
+            today_missed=Sum('missed_count', filter=is_today, default=0),
+            today_skipped=Sum('skipped_count', filter=is_today, default=0),
+            total_taken_all_time=Sum('taken_count', default=0),
+            total_missed_all_time=Sum('missed_count', default=0),
+            recent_total=Sum(
+                F('taken_count') + F('missed_count') + F('skipped_count'),
+                filter=is_recent, default=0,
+            ),
+            recent_taken=Sum('taken_count', filter=is_recent, default=0),
+        )
+        today_scheduled = (
+            stats['today_pending'] + stats['today_taken']
+            + stats['today_missed'] + stats['today_skipped']
+        )
         
-        # All-time stats
-        all_occurrences = AlarmOccurrence.objects.filter(alarm__medicine__in=medicines)
-        total_taken_all_time = all_occurrences.filter(status=AlarmOccurrence.STATUS_TAKEN).count()
-        total_missed_all_time = all_occurrences.filter(status=AlarmOccurrence.STATUS_MISSED).count()
+        # Doses past an alarm's materialized horizon (e.g. generation still
+        # pending) are expanded from the rule and count as scheduled, unless
+        # the alarm already has stored rows for today (an edited alarm keeps
+        # them until regeneration replaces them) — those are in the rollup
+        now = timezone.now()
+        virtual = expand_occurrences(alarms, today, today + timedelta(days=1))
+        rolled_up_today = set(
+            DailyAdherence.objects.filter(user=user, date=today).values_list('alarm_id', flat=True)
+        )
+        virtual_today = [
+            occurrence for occurrence in virtual
+            if today_start <= occurrence.scheduled_at < tomorrow_start
+            and occurrence.alarm_id not in rolled_up_today
+        ]
         
         # Adherence rate (last 30 days)
-        thirty_days_ago = today - timedelta(days=30)
-        recent_occurrences = AlarmOccurrence.objects.filter(
-            alarm__medicine__in=medicines,
-            scheduled_at__date__gte=thirty_days_ago,
-            scheduled_at__date__lte=today
-        ).exclude(status=AlarmOccurrence.STATUS_SCHEDULED)
-        
-        recent_total = recent_occurrences.count()
-        recent_taken = recent_occurrences.filter(status=AlarmOccurrence.STATUS_TAKEN).count()
+        recent_total = stats['recent_total']
+        recent_taken = stats['recent_taken']
         adherence_rate = (recent_taken / recent_total * 100) if recent_total > 0 else 0
         
         # Current streak (consecutive days with all doses taken)
-        current_streak = self.calculate_streak(medicines)
+        current_streak = self.calculate_streak(user)
         
         # Upcoming occurrences (next 24 hours, with pending status)
-        now = timezone.now()
         upcoming = AlarmOccurrence.objects.filter(
-            alarm__medicine__in=medicines,
+            user=user,
             scheduled_at__gte=now,
             scheduled_at__lte=now + timedelta(hours=24),
             status=AlarmOccurrence.STATUS_SCHEDULED
-        ).select_related('alarm__medicine').order_by('scheduled_at')[:5]
+        ).select_related('medicine').order_by('scheduled_at')[:5]
+        upcoming = merge_occurrences(upcoming, [
+            occurrence for occurrence in virtual
+            if now <= occurrence.scheduled_at <= now + timedelta(hours=24)
+        ])[:5]
         
         data = {
             'total_medicines': total_medicines,
             'active_alarms': active_alarms,
-            'today_scheduled': today_scheduled,
-            'today_taken': today_taken,
-            'today_missed': today_missed,
-            'today_pending': today_pending,
+            'today_scheduled': today_scheduled + len(virtual_today),
+            'today_taken': stats['today_taken'],
+            'today_missed': stats['today_missed'],
+            'today_pending': stats['today_pending'] + len(virtual_today),
             'adherence_rate': round(adherence_rate, 2),
             'current_streak': current_streak,
-            'total_taken_all_time': total_taken_all_time,
-            'total_missed_all_time': total_missed_all_time,
-            'upcoming_occurrences': AlarmOccurrenceSerializer(upcoming, many=True).data
+            'total_taken_all_time': stats['total_taken_all_time'],
+            'total_missed_all_time': stats['total_missed_all_time'],
+            'upcoming_occurrences': upcoming,
         }
         
-        serializer = DashboardSerializer(data=data)
-        if serializer.is_valid():
-            return self.success_response(
-                data=serializer.data,
-                message="Dashboard data retrieved successfully"
-            )
-        return self.error_response(errors=serializer.errors)
+        # Serialize (not validate) so the nested upcoming occurrences are rendered
+        return self.success_response(
+            data=DashboardSerializer(data).data,
+            message="Dashboard data retrieved successfully"
+        )
     
-    def calculate_streak(self, medicines):
-        """Calculate current streak of consecutive days with 100% adherence."""
-        streak = 0
-        check_date = date.today() - timedelta(days=1)  # Start from yesterday
+    def calculate_streak(self, user):
+        """
+        Calculate current streak of consecutive days with 100% adherence.
+
+        Per-day taken/total counts for the last year are summed from the
+        DailyAdherence rollup in one grouped query and walked back from
+        yesterday in memory.
+        """
+        yesterday = date.today() - timedelta(days=1)
+        first_day = yesterday - timedelta(days=364)  # Max check 1 year
         
-        for _ in range(365):  # Max check 1 year
-            day_occurrences = AlarmOccurrence.objects.filter(
-                alarm__medicine__in=medicines,
-                scheduled_at__date=check_date
-            ).exclude(status=AlarmOccurrence.STATUS_SCHEDULED)
-            
-            if day_occurrences.count() == 0:
+        # Still-scheduled doses don't count either way
+        daily = DailyAdherence.objects.filter(
+            user=user,
+            date__gte=first_day,
+            date__lte=yesterday,
+        ).values('date').annotate(
+            total=Sum(F('taken_count') + F('missed_count') + F('skipped_count')),
+            taken=Sum('taken_count'),
+        ).filter(total__gt=0).order_by()
+        by_day = {row['date']: row for row in daily}
+        
+        streak = 0
+        check_date = yesterday  # Start from yesterday
+        while check_date >= first_day:
+            row = by_day.get(check_date)
+            if row is None:
                 # No scheduled occurrences for this day
                 check_date -= timedelta(days=1)
                 continue
             
             # Check if all were taken
-            taken = day_occurrences.filter(status=AlarmOccurrence.STATUS_TAKEN).count()
-            total = day_occurrences.count()
-            
-            if taken == total:
+            if row['taken'] == row['total']:
                 streak += 1
                 check_date -= timedelta(days=1)
             else:
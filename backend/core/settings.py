@@ -104,6 +104,14 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Process-local pharmacy location snapshot used by the ping hot path.
+# Invalidated across workers over Redis pub/sub; MAX_AGE (seconds) is a
+# safety net in case an invalidation message is lost.
+PHARMACY_LOCATION_CACHE_ENABLED = True
+PHARMACY_LOCATION_CACHE_REDIS_URL = 'redis://127.0.0.1:6379/0'
+PHARMACY_LOCATION_CACHE_CHANNEL = 'pharmacy-location-cache'
+PHARMACY_LOCATION_CACHE_MAX_AGE = 300
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -232,22 +240,48 @@ from celery.schedules import crontab
 CELERY_BEAT_SCHEDULE = {
     'generate-daily-occurrences': {
         'task': 'DailyRemainder.tasks.generate_daily_occurrences',
-        'schedule': crontab(hour=0, minute=0),  # Run daily at midnight
+        'schedule': crontab(minute=0),  # Hourly top-up of the occurrence horizon
     },
     'check-missed-occurrences': {
         'task': 'DailyRemainder.tasks.check_missed_occurrences',
         'schedule': crontab(minute='*/30'),  # Run every 30 minutes
     },
+    'reconcile-missed-occurrences': {
+        'task': 'DailyRemainder.tasks.check_missed_occurrences',
+        'schedule': crontab(hour=3, minute=45),  # Daily full sweep behind the lookback window
+        'kwargs': {'full': True},
+    },
     'send-reminder-notifications': {
         'task': 'DailyRemainder.tasks.send_reminder_notifications',
-        'schedule': crontab(minute='*/2'),  # Run every 2 minutes
+        'schedule': timedelta(seconds=30),  # Pop due reminders off the dispatch queue
+    },
+    'sweep-reminder-notifications': {
+        'task': 'DailyRemainder.tasks.send_reminder_notifications',
+        'schedule': crontab(minute='*/5'),  # Database safety net for anything the queue missed
+        'kwargs': {'source': 'database'},
     },
     'record-timed-out-fomo': {
         'task': 'fomo.tasks.record_timed_out_requests',
         'schedule': crontab(minute='*/10'),  # Run every 10 minutes
     },
+    'reconcile-timed-out-fomo': {
+        'task': 'fomo.tasks.record_timed_out_requests',
+        'schedule': crontab(hour=3, minute=30),  # Daily full sweep behind the watermark
+        'kwargs': {'full': True},
+    },
 }
 
+# Days ahead of today that alarm occurrences are kept materialized. Reminders
+# and the missed sweep only need the next day or so; read endpoints expand
+# anything further out from the alarm rules on the fly.
+OCCURRENCE_HORIZON_DAYS = 2
+
+# Redis sorted set of upcoming reminder due times, filled when occurrences
+# are generated and popped by send_reminder_notifications.
+REMINDER_QUEUE_ENABLED = True
+REMINDER_QUEUE_REDIS_URL = 'redis://127.0.0.1:6379/0'
+REMINDER_QUEUE_KEY = 'reminders:due'
+
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173","http://127.0.0.1:5173"
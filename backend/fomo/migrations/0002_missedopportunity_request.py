@@ -0,0 +1,64 @@
+# Generated by Django 6.0.2 on 2026-10-16 14:05
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TIMEOUT_ITEM = re.compile(r'^Request #(\d+) \(timeout\)$')
+
+
+def link_timeout_misses(apps, schema_editor):
+    """
+    Point existing timeout rows at their request, parsed from item_name.
+    Duplicate (request, pharmacy) rows left by the old sweep are dropped,
+    keeping the earliest, so the unique constraint can be added.
+    """
+    MissedOpportunity = apps.get_model('fomo', 'MissedOpportunity')
+    MedicineRequest = apps.get_model('medicine', 'MedicineRequest')
+
+    rows = MissedOpportunity.objects.filter(
+        item_name__endswith='(timeout)',
+    ).order_by('id').values_list('id', 'pharmacy_id', 'item_name')
+
+    existing_requests = set(MedicineRequest.objects.values_list('id', flat=True))
+    seen = set()
+    to_link = []
+    duplicates = []
+    for row_id, pharmacy_id, item_name in rows.iterator():
+        match = TIMEOUT_ITEM.match(item_name)
+        if not match:
+            continue
+        request_id = int(match.group(1))
+        if request_id not in existing_requests:
+            continue
+        if (request_id, pharmacy_id) in seen:
+            duplicates.append(row_id)
+            continue
+        seen.add((request_id, pharmacy_id))
+        to_link.append(MissedOpportunity(id=row_id, request_id=request_id))
+
+    MissedOpportunity.objects.filter(id__in=duplicates).delete()
+    MissedOpportunity.objects.bulk_update(to_link, ['request'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fomo', '0001_initial'),
+        ('medicine', '0004_requestrecipient_medicinerequest_dispatched_at'),
+        ('pharmacy', '0005_pharmacy_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='missedopportunity',
+            name='request',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='missed_opportunities', to='medicine.medicinerequest'),
+        ),
+        migrations.RunPython(link_timeout_misses, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='missedopportunity',
+            constraint=models.UniqueConstraint(fields=('request', 'pharmacy'), name='fomo_missed_request_pharmacy_uniq'),
+        ),
+    ]
@@ -11,10 +11,36 @@ class MissedOpportunity(models.Model):
     item_name = models.CharField(max_length=200)
     amount_lost = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Set for misses recorded by the timeout sweep; one row per (request, pharmacy)
+    request = models.ForeignKey(
+        'medicine.MedicineRequest',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='missed_opportunities',
+    )
 
     class Meta:
         ordering = ['-timestamp']
         verbose_name_plural = 'Missed Opportunities'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['request', 'pharmacy'],
+                name='fomo_missed_request_pharmacy_uniq',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.pharmacy} — {self.item_name} (Rs.{self.amount_lost})"
+
+
+class SweepCheckpoint(models.Model):
+    """High-water mark for an incremental periodic sweep"""
+    name = models.CharField(max_length=100, unique=True)
+    # Everything created at or before this instant has been swept
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_full_run_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_created_at}"
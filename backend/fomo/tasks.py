@@ -2,56 +2,84 @@ from decimal import Decimal
 import datetime
 
 from celery import shared_task
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
-from .models import MissedOpportunity
+from .models import MissedOpportunity, SweepCheckpoint
+
+TIMEOUT_MINUTES = 10
+CHECKPOINT_NAME = 'fomo.record_timed_out_requests'
 
 
 @shared_task(name='fomo.tasks.record_timed_out_requests')
-def record_timed_out_requests():
+def record_timed_out_requests(full=False):
     """
     Runs every 10 minutes via Celery Beat.
 
     Finds medicine requests that are still PENDING and older than 10 minutes,
-    then creates a MissedOpportunity for every nearby pharmacy that never
-    responded — meaning they saw (or should have seen) the ping and ignored it.
-    """
-    from medicine.models import MedicineRequest, PharmacyResponse
+    then creates a MissedOpportunity for every pharmacy the request was
+    broadcast to (its RequestRecipients) that never responded — meaning they
+    saw (or should have seen) the ping and ignored it.
 
-    cutoff = timezone.now() - datetime.timedelta(minutes=10)
+    Incremental by default: only requests that crossed the timeout since the
+    last run (per the SweepCheckpoint watermark) are examined. ``full=True``
+    rescans every open request, picking up anything the watermark skipped
+    (e.g. a request whose dispatch ran late); beat runs that once a day.
+    """
+    from medicine.models import PharmacyResponse, RequestRecipient
 
-    timed_out = MedicineRequest.objects.filter(
-        status='PENDING',
-        created_at__lte=cutoff,
-    ).prefetch_related('responses')
+    now = timezone.now()
+    cutoff = now - datetime.timedelta(minutes=TIMEOUT_MINUTES)
 
-    created_count = 0
+    with transaction.atomic():
+        # Lock the checkpoint so overlapping sweeps run one after another
+        checkpoint, _ = SweepCheckpoint.objects.select_for_update().get_or_create(
+            name=CHECKPOINT_NAME,
+        )
+        # The first run has no watermark and sweeps everything
+        full = full or checkpoint.last_created_at is None
 
-    for request in timed_out:
-        # Get pharmacies that already responded (so we don't double-count)
-        responded_pharmacy_ids = set(
-            request.responses.values_list('pharmacy_id', flat=True)
+        recipients = RequestRecipient.objects.filter(
+            request__status='PENDING',
+            request__created_at__lte=cutoff,
         )
+        if not full:
+            recipients = recipients.filter(request__created_at__gt=checkpoint.last_created_at)
+
+        # Pharmacies that were pinged, never responded and have no timeout row yet.
+        # One anti-join; the unique (request, pharmacy) constraint backs up the
+        # dedupe if two sweeps overlap.
+        unanswered = recipients.exclude(
+            Exists(PharmacyResponse.objects.filter(
+                request_id=OuterRef('request_id'),
+                pharmacy_id=OuterRef('pharmacy_id'),
+            ))
+        ).exclude(
+            Exists(MissedOpportunity.objects.filter(
+                request_id=OuterRef('request_id'),
+                pharmacy_id=OuterRef('pharmacy_id'),
+            ))
+        ).values_list('request_id', 'pharmacy_id')
+
+        misses = [
+            MissedOpportunity(
+                request_id=request_id,
+                pharmacy_id=pharmacy_id,
+                item_name=f"Request #{request_id} (timeout)",
+                amount_lost=Decimal('150.00'),
+            )
+            for request_id, pharmacy_id in unanswered.iterator()
+        ]
+        MissedOpportunity.objects.bulk_create(misses, batch_size=1000, ignore_conflicts=True)
+
+        if checkpoint.last_created_at is None or cutoff > checkpoint.last_created_at:
+            checkpoint.last_created_at = cutoff
+        if full:
+            checkpoint.last_full_run_at = now
+        checkpoint.save()
 
-        # Find nearby pharmacies that were notified but never responded
-        nearby = request.get_nearby_pharmacies()
-        for item in nearby:
-            pharmacy = item['pharmacy']
-            if pharmacy.id in responded_pharmacy_ids:
-                continue
-
-            # Only create if we haven't already recorded this specific timeout
-            already_exists = MissedOpportunity.objects.filter(
-                pharmacy=pharmacy,
-                item_name=f"Request #{request.id} (timeout)",
-            ).exists()
-
-            if not already_exists:
-                MissedOpportunity.objects.create(
-                    pharmacy=pharmacy,
-                    item_name=f"Request #{request.id} (timeout)",
-                    amount_lost=Decimal('150.00'),
-                )
-                created_count += 1
-
-    return f"Recorded {created_count} timed-out missed opportunities"
+    # Rows skipped by ignore_conflicts aren't reported back, so this is the
+    # number of candidates, not necessarily the number of rows inserted
+    mode = 'full' if full else 'incremental'
+    return f"Found {len(misses)} timed-out missed opportunity candidate(s) ({mode})"
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from fomo.models import MissedOpportunity, SweepCheckpoint
+from fomo.tasks import CHECKPOINT_NAME, TIMEOUT_MINUTES, record_timed_out_requests
+from medicine.models import MedicineRequest, PharmacyResponse, RequestRecipient
+from pharmacy.models import Pharmacy
+
+
+class TimeoutSweepTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = CustomUser.objects.create(
+            username='fomo-patient', email='fomo-patient@example.invalid',
+            name='FOMO Patient', phone_number='9800000200',
+        )
+        cls.pharmacies = [
+            Pharmacy.objects.create(user=CustomUser.objects.create(
+                username=f'fomo-pharmacy-{i}', email=f'fomo-pharmacy-{i}@example.invalid',
+                name=f'FOMO Pharmacy {i}', phone_number='9800000201', role='PHARMACY',
+            ))
+            for i in range(3)
+        ]
+
+    def make_request(self, age, status='PENDING', pharmacies=None):
+        """A request created ``age`` ago and broadcast to ``pharmacies`` (all by default)."""
+        request = MedicineRequest.objects.create(
+            patient=self.patient, quantity=1, image='prescriptions/test.png', status=status,
+        )
+        MedicineRequest.objects.filter(pk=request.pk).update(created_at=timezone.now() - age)
+        RequestRecipient.objects.bulk_create([
+            RequestRecipient(request=request, pharmacy=pharmacy, distance_km=1)
+            for pharmacy in (self.pharmacies if pharmacies is None else pharmacies)
+        ])
+        return request
+
+    def missed(self):
+        return set(MissedOpportunity.objects.values_list('request_id', 'pharmacy_id'))
+
+    def test_records_only_unanswered_recipients_of_timed_out_requests(self):
+        timed_out = self.make_request(timedelta(minutes=TIMEOUT_MINUTES + 5), pharmacies=self.pharmacies[:2])
+        PharmacyResponse.objects.create(request=timed_out, pharmacy=self.pharmacies[0], response_type='REJECTED')
+        self.make_request(timedelta(minutes=1))
+        self.make_request(timedelta(minutes=TIMEOUT_MINUTES + 5), status='ACCEPTED')
+
+        result = record_timed_out_requests()
+
+        self.assertEqual(self.missed(), {(timed_out.id, self.pharmacies[1].id)})
+        self.assertEqual(result, "Found 1 timed-out missed opportunity candidate(s) (full)")
+
+    def test_rerun_does_not_duplicate(self):
+        request = self.make_request(timedelta(minutes=TIMEOUT_MINUTES + 5))
+        record_timed_out_requests(full=True)
+
+        result = record_timed_out_requests(full=True)
+
+        self.assertEqual(self.missed(), {(request.id, pharmacy.id) for pharmacy in self.pharmacies})
+        self.assertEqual(result, "Found 0 timed-out missed opportunity candidate(s) (full)")
+
+    def test_incremental_run_picks_up_requests_that_timed_out_since(self):
+        record_timed_out_requests()
+        request = self.make_request(timedelta(minutes=1))
+
+        later = timezone.now() + timedelta(minutes=TIMEOUT_MINUTES)
+        with mock.patch('fomo.tasks.timezone.now', return_value=later):
+            result = record_timed_out_requests()
+
+        self.assertEqual(result, "Found 3 timed-out missed opportunity candidate(s) (incremental)")
+        self.assertEqual(self.missed(), {(request.id, pharmacy.id) for pharmacy in self.pharmacies})
+        checkpoint = SweepCheckpoint.objects.get(name=CHECKPOINT_NAME)
+        self.assertEqual(checkpoint.last_created_at, later - timedelta(minutes=TIMEOUT_MINUTES))
+
+    def test_full_run_catches_requests_behind_the_watermark(self):
+        record_timed_out_requests()
+        # Broadcast late, after the watermark already moved past its creation
+        late = self.make_request(timedelta(minutes=TIMEOUT_MINUTES + 30))
+
+        self.assertIn("(incremental)", record_timed_out_requests())
+        self.assertEqual(self.missed(), set())
+
+        self.assertIn("(full)", record_timed_out_requests(full=True))
+        self.assertEqual(self.missed(), {(late.id, pharmacy.id) for pharmacy in self.pharmacies})
+        self.assertIsNotNone(SweepCheckpoint.objects.get(name=CHECKPOINT_NAME).last_full_run_at)
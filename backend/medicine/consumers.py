@@ -155,6 +155,16 @@ class CustomerConsumer(AsyncWebsocketConsumer):
             'timestamp': event['timestamp']
         }))
 
+    async def request_dispatched(self, event):
+        """
+        Receive confirmation that the request was broadcast to nearby pharmacies
+        """
+        await self.send(text_data=json.dumps({
+            'type': 'request_dispatched',
+            'request_id': event['request_id'],
+            'pharmacies_notified': event['pharmacies_notified'],
+        }))
+
 
 class PharmacyConsumer(AsyncWebsocketConsumer):
     """
@@ -23,6 +23,22 @@ def _get_user_tokens(user) -> list[str]:
     )
 
 
+def _get_tokens_by_user(user_ids) -> dict[int, list[str]]:
+    """Return active FCM tokens for many users in one query, keyed by user id."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+
+    from DailyRemainder.models import DeviceToken
+    tokens_by_user: dict[int, list[str]] = {}
+    rows = DeviceToken.objects.filter(
+        user_id__in=user_ids, is_active=True,
+    ).values_list('user_id', 'token')
+    for user_id, token in rows:
+        tokens_by_user.setdefault(user_id, []).append(token)
+    return tokens_by_user
+
+
 def _deactivate_tokens(tokens: list[str]) -> None:
     """Mark stale tokens as inactive so we stop sending to them."""
     if not tokens:
@@ -37,31 +53,62 @@ def _safe_send_multicast(
     title: str,
     body: str,
     data: dict | None = None,
-) -> None:
+) -> bool:
     """
     Best-effort multicast push.  Never raises — errors are logged.
     Automatically deactivates any unregistered tokens.
+    Returns True if FCM accepted the message for at least one token.
     """
     if not tokens:
-        return
+        return False
 
     try:
         from utils.firebase import send_multicast_notification, is_firebase_available
     except ImportError:
         logger.warning("Firebase module not available — skipping push")
-        return
+        return False
 
     if not is_firebase_available():
         logger.info("Firebase not initialized — skipping push")
-        return
+        return False
 
     try:
         result = send_multicast_notification(
             tokens=tokens, title=title, body=body, data=data,
         )
         _deactivate_tokens(result.get('failed_tokens', []))
+        return result.get('success_count', 0) > 0
     except Exception as e:
         logger.error("FCM multicast error: %s", e)
+        return False
+
+
+def _safe_send_each(notifications: list[dict]) -> list[bool]:
+    """
+    Best-effort batched push of individually addressed notifications.
+    Never raises — errors are logged. Automatically deactivates any
+    unregistered tokens. Returns one delivered flag per notification.
+    """
+    if not notifications:
+        return []
+
+    try:
+        from utils.firebase import send_each_notification, is_firebase_available
+    except ImportError:
+        logger.warning("Firebase module not available — skipping push")
+        return [False] * len(notifications)
+
+    if not is_firebase_available():
+        logger.info("Firebase not initialized — skipping push")
+        return [False] * len(notifications)
+
+    try:
+        result = send_each_notification(notifications)
+        _deactivate_tokens(result.get('failed_tokens', []))
+        return result['results']
+    except Exception as e:
+        logger.error("FCM send_each error: %s", e)
+        return [False] * len(notifications)
 
 
 # ─── Public helpers called from views.py ─────────────────────────────────────
@@ -71,30 +118,45 @@ def notify_pharmacies_new_request(
     request_id: int,
     patient_name: str,
     quantity: int,
-) -> None:
+) -> dict[int, bool]:
     """
     Push 'new_request' to every nearby pharmacy's registered devices.
-    Called from MedicineRequestApiView.post() after the WebSocket broadcast.
+    Called from the request dispatcher after the WebSocket broadcast.
+
+    Returns {pharmacy_id: delivered} for pharmacies that have at least one
+    active device token; pharmacies without tokens are left out.
     """
+    tokens_by_user = _get_tokens_by_user(
+        item['pharmacy'].user_id for item in nearby_pharmacies
+    )
+
+    # One message per device so each pharmacy sees its own distance,
+    # sent in batches of up to 500 per FCM call.
+    notifications = []
+    owners = []
     for item in nearby_pharmacies:
         pharmacy = item['pharmacy']
         distance = item['distance']
-        user = pharmacy.user
-        tokens = _get_user_tokens(user)
-        if not tokens:
-            continue
-
-        _safe_send_multicast(
-            tokens=tokens,
-            title="New Medicine Request",
-            body=f"{patient_name} needs medicine — {distance:.1f} km away (Qty: {quantity})",
-            data={
-                'type': 'new_request',
-                'request_id': str(request_id),
-                'patient_name': patient_name,
-                'distance_km': str(round(distance, 2)),
-            },
-        )
+        body = f"{patient_name} needs medicine — {distance:.1f} km away (Qty: {quantity})"
+        for token in tokens_by_user.get(pharmacy.user_id, []):
+            notifications.append({
+                'token': token,
+                'title': "New Medicine Request",
+                'body': body,
+                'data': {
+                    'type': 'new_request',
+                    'request_id': str(request_id),
+                    'patient_name': patient_name,
+                    'distance_km': str(round(distance, 2)),
+                    'body': body,
+                },
+            })
+            owners.append(pharmacy.id)
+
+    delivered: dict[int, bool] = {}
+    for pharmacy_id, ok in zip(owners, _safe_send_each(notifications)):
+        delivered[pharmacy_id] = delivered.get(pharmacy_id, False) or ok
+    return delivered
 
 
 def notify_patient_pharmacy_response(
@@ -169,21 +231,19 @@ def notify_pharmacies_request_taken(
     Push 'request_taken' to other nearby pharmacies when a patient selects one.
     Called from PatientSelectPharmacyView.post().
     """
-    for item in nearby_pharmacies:
-        pharmacy = item['pharmacy']
-        if pharmacy.id == selected_pharmacy_id:
-            continue
-        user = pharmacy.user
-        tokens = _get_user_tokens(user)
-        if not tokens:
-            continue
-
-        _safe_send_multicast(
-            tokens=tokens,
-            title="Request Filled",
-            body="This medicine request has been accepted by another pharmacy.",
-            data={
-                'type': 'request_taken',
-                'request_id': str(request_id),
-            },
-        )
+    tokens_by_user = _get_tokens_by_user(
+        item['pharmacy'].user_id for item in nearby_pharmacies
+        if item['pharmacy'].id != selected_pharmacy_id
+    )
+    tokens = [token for user_tokens in tokens_by_user.values() for token in user_tokens]
+
+    # Same text for everyone — a single multicast, chunked at 500 tokens
+    _safe_send_multicast(
+        tokens=tokens,
+        title="Request Filled",
+        body="This medicine request has been accepted by another pharmacy.",
+        data={
+            'type': 'request_taken',
+            'request_id': str(request_id),
+        },
+    )
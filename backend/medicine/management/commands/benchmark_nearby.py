@@ -0,0 +1,127 @@
+"""
+Management command: benchmark_nearby
+
+Measures MedicineRequest.get_nearby_pharmacies() latency as the number of
+pharmacies grows. Synthetic pharmacies are scattered across Nepal inside a
+transaction that is rolled back at the end, so the database is left untouched.
+
+Usage:
+    python manage.py benchmark_nearby                          # 100 → 100k
+    python manage.py benchmark_nearby --sizes 1000 50000       # custom sizes
+    python manage.py benchmark_nearby --pings 200 --radius 3
+    python manage.py benchmark_nearby --source database        # skip the snapshot
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from accounts.models import CustomUser
+from medicine.models import MedicineRequest
+from pharmacy import location_cache
+from pharmacy.models import Pharmacy
+from utils.geo import encode_geohash
+
+# Rough bounding box of Nepal
+LAT_RANGE = (26.35, 30.45)
+LNG_RANGE = (80.05, 88.20)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark nearby-pharmacy lookup latency against synthetic pharmacy counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+            help='Total pharmacy counts to benchmark (default: 100 1000 10000 100000)'
+        )
+        parser.add_argument(
+            '--pings', type=int, default=50,
+            help='Number of lookups to time at each size (default: 50)'
+        )
+        parser.add_argument(
+            '--radius', type=float, default=5.0,
+            help='Search radius in km (default: 5)'
+        )
+        parser.add_argument(
+            '--source', choices=['snapshot', 'database'], default='snapshot',
+            help='Match against the in-memory location snapshot or query the database'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Random seed so runs are comparable'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sizes = sorted(options['sizes'])
+
+        use_snapshot = options['source'] == 'snapshot'
+
+        self.stdout.write(f"{'pharmacies':>12} {'median ms':>10} {'p95 ms':>10} {'avg hits':>9}")
+        try:
+            with transaction.atomic(), override_settings(PHARMACY_LOCATION_CACHE_ENABLED=use_snapshot):
+                created = 0
+                for size in sizes:
+                    if size > created:
+                        self._create_pharmacies(rng, created, size - created)
+                        created = size
+                    if use_snapshot:
+                        # bulk_create skips signals, so rebuild explicitly (untimed)
+                        location_cache.refresh()
+                    self._report(rng, size, options['pings'], options['radius'])
+                raise _Rollback
+        except _Rollback:
+            pass
+        if use_snapshot:
+            location_cache.refresh()
+
+        self.stdout.write(self.style.SUCCESS('Done — synthetic data rolled back.'))
+
+    def _create_pharmacies(self, rng, offset, count, batch_size=5000):
+        for start in range(0, count, batch_size):
+            batch = range(offset + start, offset + min(start + batch_size, count))
+            users = CustomUser.objects.bulk_create([
+                CustomUser(
+                    username=f'bench-pharmacy-{i}',
+                    email=f'bench-pharmacy-{i}@example.invalid',
+                    name=f'Bench Pharmacy {i}',
+                    phone_number='9800000000',
+                    role=CustomUser.Types.PHARMACY,
+                )
+                for i in batch
+            ])
+            pharmacies = []
+            for user in users:
+                lat = rng.uniform(*LAT_RANGE)
+                lng = rng.uniform(*LNG_RANGE)
+                pharmacies.append(Pharmacy(
+                    user=user, lat=lat, lng=lng, geohash=encode_geohash(lat, lng),
+                ))
+            Pharmacy.objects.bulk_create(pharmacies)
+
+    def _report(self, rng, size, pings, radius):
+        timings = []
+        hits = 0
+        for _ in range(pings):
+            request = MedicineRequest(
+                patient_lat=rng.uniform(*LAT_RANGE),
+                patient_lng=rng.uniform(*LNG_RANGE),
+                radius_km=radius,
+            )
+            started = time.perf_counter()
+            hits += len(request.get_nearby_pharmacies())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{size:>12} {statistics.median(timings):>10.2f} {p95:>10.2f} {hits / pings:>9.1f}"
+        )
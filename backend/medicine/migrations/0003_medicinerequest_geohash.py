@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-16 11:40
+
+from django.db import migrations, models
+
+
+# MedicineRequest.MAX_RADIUS_KM when this migration was written
+MAX_RADIUS_KM = 10.0
+
+
+def backfill_geohash(apps, schema_editor):
+    from utils.geo import encode_geohash
+
+    MedicineRequest = apps.get_model('medicine', 'MedicineRequest')
+    # Cells are sized from MAX_RADIUS_KM, so wider requests would drop out of
+    # pharmacy feeds; clamp them like the serializer now does
+    MedicineRequest.objects.filter(radius_km__gt=MAX_RADIUS_KM).update(radius_km=MAX_RADIUS_KM)
+    requests = list(MedicineRequest.objects.only('id', 'patient_lat', 'patient_lng'))
+    for request in requests:
+        request.geohash = encode_geohash(request.patient_lat, request.patient_lng)
+    MedicineRequest.objects.bulk_update(requests, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0002_pharmacyresponse_substitute_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicinerequest',
+            name='geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='medicinerequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['geohash'], name='medreq_pending_geohash_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
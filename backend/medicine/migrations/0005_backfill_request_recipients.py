@@ -0,0 +1,58 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_recipients(apps, schema_editor):
+    """
+    Requests broadcast by the old synchronous view have no RequestRecipient
+    rows, so selecting a pharmacy would send no request_taken and the FOMO
+    sweep would never record their misses. Record the pharmacies in range of
+    every open request that was never dispatched, as that view sent to them.
+    """
+    import numpy as np
+    from utils.geo import distances_from
+
+    MedicineRequest = apps.get_model('medicine', 'MedicineRequest')
+    RequestRecipient = apps.get_model('medicine', 'RequestRecipient')
+    Pharmacy = apps.get_model('pharmacy', 'Pharmacy')
+
+    legacy = MedicineRequest.objects.filter(id__in=list(
+        MedicineRequest.objects.filter(
+            status='PENDING',
+            dispatched_at__isnull=True,
+            recipients__isnull=True,
+        ).values_list('id', flat=True)
+    ))
+    pharmacies = list(Pharmacy.objects.values_list('id', 'lat', 'lng'))
+    if pharmacies:
+        pharmacy_ids, lats, lngs = zip(*pharmacies)
+        for request in legacy.only('id', 'patient_lat', 'patient_lng', 'radius_km').iterator():
+            distances = distances_from(request.patient_lat, request.patient_lng, lats, lngs)
+            RequestRecipient.objects.bulk_create(
+                [
+                    RequestRecipient(
+                        request_id=request.id,
+                        pharmacy_id=pharmacy_ids[i],
+                        distance_km=float(distances[i]),
+                        websocket_status='SENT',
+                        push_status='SENT',
+                    )
+                    for i in np.flatnonzero(distances <= request.radius_km)
+                ],
+                ignore_conflicts=True,
+            )
+
+    # The old view broadcast at creation time
+    legacy.update(dispatched_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0004_requestrecipient_medicinerequest_dispatched_at'),
+        ('pharmacy', '0005_pharmacy_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_recipients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-16 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0005_backfill_request_recipients'),
+        ('pharmacy', '0005_pharmacy_geohash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicinerequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['created_at'], name='medreq_pending_created_idx'),
+        ),
+    ]
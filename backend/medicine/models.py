@@ -1,10 +1,16 @@
 from django.db import models
 from accounts.serializers import CustomUser
 from pharmacy.models import Pharmacy
-import math
+from pharmacy import location_cache
+from utils import geo
+import numpy as np
 
 # Create your models here.
 class MedicineRequest(models.Model):
+    # Largest search radius; open requests are looked up by the geohash cells
+    # covering this distance, so a larger radius_km would be missed
+    MAX_RADIUS_KM = 10.0
+
     STATUS_CHOICES = (
         ("PENDING", "PENDING"),
         ("ACCEPTED", "ACCEPTED"),
@@ -33,6 +39,10 @@ class MedicineRequest(models.Model):
     
     # Search radius in kilometers
     radius_km = models.FloatField(default=5.0)
+
+    # Geohash of the patient location — open requests are indexed by it so a
+    # pharmacy's pending feed only scans requests in neighbouring cells
+    geohash = models.CharField(max_length=12, blank=True, default='')
     
     quantity = models.IntegerField()
     image = models.ImageField(upload_to="prescriptions/")
@@ -42,40 +52,118 @@ class MedicineRequest(models.Model):
         default="PENDING",
     )
 
+    # Set by the dispatcher once matching and fan-out have finished
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Only open requests are looked up by location
+            models.Index(
+                fields=['geohash'],
+                condition=models.Q(status='PENDING'),
+                name='medreq_pending_geohash_idx',
+            ),
+            # Timeout sweep scans open requests by age
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status='PENDING'),
+                name='medreq_pending_created_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.geohash = geo.encode_geohash(self.patient_lat, self.patient_lng)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'patient_lat', 'patient_lng'} & set(update_fields)):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def pending_near(cls, lat, lng):
+        """
+        PENDING requests whose patient is close enough that ``(lat, lng)`` could
+        fall inside their radius. Served from the partial geohash index; callers
+        still apply each request's own radius_km.
+        """
+        cells = geo.covering_cells(lat, lng, cls.MAX_RADIUS_KM)
+        requests = cls.objects.filter(status='PENDING')
+        if cells:
+            requests = requests.filter(geo.cell_filter(cells))
+        return requests
+    
+    def get_recipients(self):
+        """
+        Pharmacies this request was broadcast to, as recorded by the dispatcher,
+        in the same shape as get_nearby_pharmacies(). Unlike re-matching, this
+        is unaffected by pharmacies that moved or registered since the ping.
+        """
+        recipients = self.recipients.select_related('pharmacy').order_by('distance_km')
+        return [
+            {'pharmacy': recipient.pharmacy, 'distance': recipient.distance_km}
+            for recipient in recipients
+        ]
     
     def get_nearby_pharmacies(self):
-        """Get all pharmacies within the radius"""
-        all_pharmacies = Pharmacy.objects.all()
-        nearby = []
-        
-        for pharmacy in all_pharmacies:
-            distance = self.calculate_distance(
-                self.patient_lat, self.patient_lng,
-                pharmacy.lat, pharmacy.lng
-            )
-            if distance <= self.radius_km:
-                nearby.append({'pharmacy': pharmacy, 'distance': distance})
-        
-        # Sort by distance
-        nearby.sort(key=lambda x: x['distance'])
-        return nearby
+        """Get all pharmacies within the radius, nearest first"""
+        if location_cache.is_enabled():
+            return self._nearby_from_snapshot()
+        return self._nearby_from_database()
+
+    def _nearby_from_snapshot(self):
+        """Match against the in-memory location snapshot; only hydrate the hits"""
+        snapshot = location_cache.get_snapshot()
+        rows, distances = snapshot.nearby(self.patient_lat, self.patient_lng, self.radius_km)
+        if not len(rows):
+            return []
+
+        pharmacy_ids = snapshot.pharmacy_ids[rows].tolist()
+        pharmacies = Pharmacy.objects.select_related('user').in_bulk(pharmacy_ids)
+        return [
+            {'pharmacy': pharmacies[pharmacy_id], 'distance': float(distance)}
+            for pharmacy_id, distance in zip(pharmacy_ids, distances)
+            # Skip rows deleted since the snapshot was built
+            if pharmacy_id in pharmacies
+        ]
+
+    def _nearby_from_database(self):
+        """Geohash + bounding-box prefilter in SQL, exact distance in NumPy"""
+        min_lat, max_lat, min_lng, max_lng = geo.bounding_box(
+            self.patient_lat, self.patient_lng, self.radius_km
+        )
+        candidates = Pharmacy.objects.filter(
+            lat__range=(min_lat, max_lat),
+            lng__range=(min_lng, max_lng),
+        ).select_related('user')
+
+        # Narrow to the geohash cells covering the box so the DB can use the index
+        cells = geo.covering_cells(self.patient_lat, self.patient_lng, self.radius_km)
+        if cells:
+            candidates = candidates.filter(geo.cell_filter(cells))
+
+        candidates = list(candidates)
+        if not candidates:
+            return []
+
+        distances = geo.distances_from(
+            self.patient_lat, self.patient_lng,
+            [p.lat for p in candidates], [p.lng for p in candidates],
+        )
+
+        # Keep those inside the radius, sorted by distance
+        in_range = np.flatnonzero(distances <= self.radius_km)
+        in_range = in_range[np.argsort(distances[in_range], kind='stable')]
+        return [
+            {'pharmacy': candidates[i], 'distance': float(distances[i])}
+            for i in in_range
+        ]
     
     @staticmethod
     def calculate_distance(lat1, lon1, lat2, lon2):
         """Calculate distance between two coordinates using Haversine formula"""
-        R = 6371  # Earth radius in kilometers
-        
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
+        return geo.haversine_km(lat1, lon1, lat2, lon2)
 
 class PharmacyResponse(models.Model):
     """Track responses from pharmacies (accept/reject/substitute with optional audio)"""
@@ -117,4 +205,37 @@ class PharmacyResponse(models.Model):
     responded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        unique_together = ['request', 'pharmacy']  # One response per pharmacy per request
\ No newline at end of file
+        unique_together = ['request', 'pharmacy']  # One response per pharmacy per request
+
+
+class RequestRecipient(models.Model):
+    """A pharmacy a request was broadcast to, with per-channel delivery status"""
+    DELIVERY_CHOICES = (
+        ("PENDING", "PENDING"),
+        ("SENT", "SENT"),
+        ("FAILED", "FAILED"),
+        ("SKIPPED", "SKIPPED"),  # e.g. no registered device for push
+    )
+
+    request = models.ForeignKey(
+        MedicineRequest,
+        on_delete=models.CASCADE,
+        related_name="recipients",
+    )
+
+    pharmacy = models.ForeignKey(
+        Pharmacy,
+        on_delete=models.CASCADE,
+        related_name="received_requests",
+    )
+
+    distance_km = models.FloatField()
+
+    websocket_status = models.CharField(max_length=10, choices=DELIVERY_CHOICES, default="PENDING")
+    push_status = models.CharField(max_length=10, choices=DELIVERY_CHOICES, default="PENDING")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['request', 'pharmacy']  # Broadcast once per pharmacy per request
@@ -9,7 +9,13 @@ class MedicineRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = MedicineRequest
         fields = '__all__'
-        read_only_fields = ['patient', 'status', 'created_at', 'updated_at', 'pharmacy']
+        read_only_fields = ['patient', 'status', 'created_at', 'updated_at', 'pharmacy', 'geohash']
+
+    def validate_radius_km(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("radius_km must be greater than 0.")
+        # Larger radii were accepted before the geohash feed; clamp rather than reject
+        return min(value, MedicineRequest.MAX_RADIUS_KM)
 
 
 class PharmacyResponseSerializer(serializers.ModelSerializer):
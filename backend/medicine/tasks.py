@@ -0,0 +1,148 @@
+import logging
+
+from celery import shared_task
+from django.utils import timezone
+
+from utils.broadcast import group_send_many
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(
+    bind=True,
+    name='medicine.tasks.dispatch_medicine_request',
+    max_retries=3,
+    default_retry_delay=5,
+)
+def dispatch_medicine_request(self, request_id, image_url):
+    """
+    Fan a freshly created medicine request out to nearby pharmacies.
+
+    Queued by MedicineRequestApiView.post() so the patient gets their 201 as
+    soon as the request is saved. This task then:
+      1. matches nearby pharmacies and records them as RequestRecipients
+         (first attempt only; retries load the recorded set)
+      2. broadcasts `new_request` over WebSocket
+      3. sends the FCM push
+      4. stores per-pharmacy delivery status for each channel
+      5. tells the patient how many pharmacies were notified
+
+    Safe to retry: pharmacies already marked SENT on a channel are skipped.
+    """
+    from medicine.models import MedicineRequest, RequestRecipient
+    from medicine.fcm_helpers import notify_pharmacies_new_request
+
+    try:
+        medicine_request = MedicineRequest.objects.select_related('patient').get(id=request_id)
+    except MedicineRequest.DoesNotExist:
+        return f"Request #{request_id} not found"
+
+    if medicine_request.status != 'PENDING':
+        return f"Request #{request_id} is {medicine_request.status} — nothing to dispatch"
+
+    patient = medicine_request.patient
+
+    try:
+        # Match once; retries reuse the recorded set so pharmacies that moved
+        # in or out of range since the first attempt don't change the targets
+        nearby_pharmacies = medicine_request.get_recipients()
+        if not nearby_pharmacies:
+            RequestRecipient.objects.bulk_create(
+                [
+                    RequestRecipient(
+                        request=medicine_request,
+                        pharmacy=item['pharmacy'],
+                        distance_km=item['distance'],
+                    )
+                    for item in medicine_request.get_nearby_pharmacies()
+                ],
+                ignore_conflicts=True,
+            )
+            nearby_pharmacies = medicine_request.get_recipients()
+        recipients = RequestRecipient.objects.filter(request=medicine_request)
+
+        # ── WebSocket ────────────────────────────────────────────
+        ws_done = set(
+            recipients.filter(websocket_status='SENT').values_list('pharmacy_id', flat=True)
+        )
+        ws_targets = [
+            item for item in nearby_pharmacies if item['pharmacy'].id not in ws_done
+        ]
+        delivered = group_send_many(
+            (
+                f"pharmacy_{item['pharmacy'].id}",
+                {
+                    'type': 'new_request',
+                    'request_id': medicine_request.id,
+                    'patient_name': patient.name,
+                    'patient_phone': patient.phone_number,
+                    'patient_location': {
+                        'lat': medicine_request.patient_lat,
+                        'lng': medicine_request.patient_lng
+                    },
+                    'distance_km': round(item['distance'], 2),
+                    'quantity': medicine_request.quantity,
+                    'image_url': image_url,
+                    'timestamp': medicine_request.created_at.isoformat()
+                },
+            )
+            for item in ws_targets
+        )
+        _record_status(recipients, 'websocket_status', {
+            item['pharmacy'].id: 'SENT' if ok else 'FAILED'
+            for item, ok in zip(ws_targets, delivered)
+        })
+
+        # ── FCM push (works even when app is killed) ─────────────
+        push_done = set(
+            recipients.exclude(push_status__in=['PENDING', 'FAILED'])
+            .values_list('pharmacy_id', flat=True)
+        )
+        push_targets = [
+            item for item in nearby_pharmacies if item['pharmacy'].id not in push_done
+        ]
+        pushed = notify_pharmacies_new_request(
+            nearby_pharmacies=push_targets,
+            request_id=medicine_request.id,
+            patient_name=patient.name,
+            quantity=medicine_request.quantity,
+        )
+        _record_status(recipients, 'push_status', {
+            item['pharmacy'].id: (
+                'SKIPPED' if item['pharmacy'].id not in pushed
+                else 'SENT' if pushed[item['pharmacy'].id]
+                else 'FAILED'
+            )
+            for item in push_targets
+        })
+
+    except Exception as exc:
+        logger.error("Dispatch of request #%s failed: %s", request_id, exc)
+        raise self.retry(exc=exc)
+
+    medicine_request.dispatched_at = timezone.now()
+    medicine_request.save(update_fields=['dispatched_at'])
+
+    group_send_many([(
+        f"user_{patient.id}",
+        {
+            'type': 'request_dispatched',
+            'request_id': medicine_request.id,
+            'pharmacies_notified': len(nearby_pharmacies),
+        },
+    )])
+
+    logger.info("Dispatched request #%s to %d pharmacies", request_id, len(nearby_pharmacies))
+    return f"Dispatched request #{request_id} to {len(nearby_pharmacies)} pharmacies"
+
+
+def _record_status(recipients, field, status_by_pharmacy):
+    """Write delivery statuses with one UPDATE per distinct status."""
+    by_status = {}
+    for pharmacy_id, status in status_by_pharmacy.items():
+        by_status.setdefault(status, []).append(pharmacy_id)
+
+    for status, pharmacy_ids in by_status.items():
+        recipients.filter(pharmacy_id__in=pharmacy_ids).update(
+            **{field: status, 'updated_at': timezone.now()}
+        )
@@ -1,3 +1,139 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from medicine.models import MedicineRequest, PharmacyResponse, RequestRecipient
+from medicine.serializers import MedicineRequestSerializer
+from medicine.tasks import dispatch_medicine_request
+from pharmacy.models import Pharmacy
+from utils import geo
+
+# Kathmandu; one degree of latitude is ~111 km
+LAT, LNG = 27.7172, 85.3240
+
+
+def make_request(patient, lat=LAT, lng=LNG, **fields):
+    return MedicineRequest.objects.create(
+        patient=patient, patient_lat=lat, patient_lng=lng, quantity=1, image='prescriptions/test.png', **fields,
+    )
+
+
+class PendingNearTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = CustomUser.objects.create(
+            username='patient', email='patient@example.invalid', name='Patient', phone_number='9800000100',
+        )
+
+    def test_save_stores_geohash(self):
+        request = make_request(self.patient)
+        self.assertEqual(request.geohash, geo.encode_geohash(LAT, LNG))
+
+    def test_finds_open_requests_within_max_radius(self):
+        # ~9 km north and ~9 km east, across geohash cell boundaries
+        north = make_request(self.patient, lat=LAT + 9 / geo.KM_PER_DEGREE)
+        east = make_request(self.patient, lng=LNG + 0.092)
+        far = make_request(self.patient, lat=LAT + 0.5)
+        accepted = make_request(self.patient, status='ACCEPTED')
+
+        found = set(MedicineRequest.pending_near(LAT, LNG))
+
+        self.assertIn(north, found)
+        self.assertIn(east, found)
+        self.assertNotIn(far, found)
+        self.assertNotIn(accepted, found)
+
+    def test_pharmacy_feed_applies_each_request_radius(self):
+        pharmacy = Pharmacy.objects.create(
+            user=CustomUser.objects.create(
+                username='feed-pharmacy', email='feed-pharmacy@example.invalid',
+                name='Feed Pharmacy', phone_number='9800000103', role='PHARMACY',
+            ),
+            lat=LAT, lng=LNG,
+        )
+        seven_km = LAT + 7 / geo.KM_PER_DEGREE
+        close = make_request(self.patient, lat=LAT + 3 / geo.KM_PER_DEGREE, radius_km=5)
+        wide = make_request(self.patient, lat=seven_km, radius_km=10)
+        make_request(self.patient, lat=seven_km, radius_km=5)
+        answered = make_request(self.patient, radius_km=5)
+        PharmacyResponse.objects.create(request=answered, pharmacy=pharmacy, response_type='REJECTED')
+        client = APIClient()
+        client.force_authenticate(pharmacy.user)
+
+        response = client.get('/medicine/request/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({item['id'] for item in response.data['requests']}, {close.id, wide.id})
+
+    def test_serializer_clamps_radius_to_max(self):
+        serializer = MedicineRequestSerializer(data={
+            'patient_lat': LAT, 'patient_lng': LNG, 'radius_km': 50, 'quantity': 1,
+        }, partial=True)
+
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['radius_km'], MedicineRequest.MAX_RADIUS_KM)
+
+    def test_serializer_rejects_non_positive_radius(self):
+        serializer = MedicineRequestSerializer(data={'radius_km': 0}, partial=True)
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('radius_km', serializer.errors)
+
+
+@override_settings(PHARMACY_LOCATION_CACHE_ENABLED=False)
+class DispatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = CustomUser.objects.create(
+            username='dispatch-patient', email='dispatch-patient@example.invalid',
+            name='Dispatch Patient', phone_number='9800000101',
+        )
+        cls.near, cls.nearer, cls.far = [
+            Pharmacy.objects.create(
+                user=CustomUser.objects.create(
+                    username=f'dispatch-pharmacy-{i}', email=f'dispatch-pharmacy-{i}@example.invalid',
+                    name=f'Dispatch Pharmacy {i}', phone_number='9800000102', role='PHARMACY',
+                ),
+                lat=LAT + km / geo.KM_PER_DEGREE,
+                lng=LNG,
+            )
+            for i, km in enumerate((3, 1, 8))
+        ]
+
+    def setUp(self):
+        self.request = make_request(self.patient, radius_km=5)
+
+    def dispatch(self):
+        with mock.patch('medicine.tasks.group_send_many', side_effect=lambda messages: [True for _ in messages]) as send, \
+                mock.patch('medicine.fcm_helpers.notify_pharmacies_new_request', return_value={}):
+            dispatch_medicine_request(self.request.id, 'http://testserver/prescription.png')
+        return send
+
+    def test_records_recipients_nearest_first(self):
+        send = self.dispatch()
+
+        self.assertEqual(
+            [item['pharmacy'] for item in self.request.get_recipients()],
+            [self.nearer, self.near],
+        )
+        patient_event = send.call_args_list[-1].args[0][0]
+        self.assertEqual(patient_event[1]['type'], 'request_dispatched')
+        self.assertEqual(patient_event[1]['pharmacies_notified'], 2)
+
+    def test_retry_targets_the_recorded_set(self):
+        self.dispatch()
+        # Between attempts one recipient moves away and another pharmacy moves in
+        Pharmacy.objects.filter(pk=self.near.pk).update(lat=LAT + 1)
+        Pharmacy.objects.filter(pk=self.far.pk).update(lat=LAT)
+
+        send = self.dispatch()
+
+        self.assertEqual(
+            set(RequestRecipient.objects.filter(request=self.request).values_list('pharmacy_id', flat=True)),
+            {self.near.id, self.nearer.id},
+        )
+        self.assertEqual(send.call_args_list[-1].args[0][0][1]['pharmacies_notified'], 2)
@@ -1,5 +1,7 @@
 from decimal import Decimal
 
+import numpy as np
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -8,75 +10,49 @@ from medicine.serializers import MedicineRequestSerializer, PharmacyResponseSeri
 from medicine.models import MedicineRequest, PharmacyResponse
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from utils import geo
+from utils.broadcast import group_send_many
+from django.db import transaction
+from medicine.tasks import dispatch_medicine_request
 from medicine.fcm_helpers import (
-    notify_pharmacies_new_request,
     notify_patient_pharmacy_response,
     notify_pharmacy_selected,
     notify_pharmacies_request_taken,
 )
 
 
+def _queue_dispatch(request_id, image_url):
+    """Hand the request to the dispatcher; run it inline if the broker is down."""
+    try:
+        dispatch_medicine_request.delay(request_id, image_url)
+    except Exception as e:
+        print(f"Could not queue dispatch for request #{request_id} ({e}) — dispatching inline")
+        dispatch_medicine_request.apply(args=(request_id, image_url))
+
+
 class MedicineRequestApiView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
         """
         Customer creates a medicine request (ping)
-        Broadcasts to ALL nearby pharmacies in real-time
+        Acknowledged immediately; matching, WebSocket broadcast and FCM push
+        to nearby pharmacies run in the dispatch_medicine_request task
         """
         serializer = MedicineRequestSerializer(data=request.data)
         if serializer.is_valid():
             medicine_request = serializer.save(patient=request.user)
-            
-            # Get all nearby pharmacies
-            nearby_pharmacies = medicine_request.get_nearby_pharmacies()
-            
-            if not nearby_pharmacies:
-                return Response({
-                    'message': 'No pharmacies found in your area',
-                    'request_id': medicine_request.id
-                }, status=status.HTTP_201_CREATED)
-            
-            # Broadcast to ALL nearby pharmacies via WebSocket
-            channel_layer = get_channel_layer()
-            print(f"\n=== Broadcasting to {len(nearby_pharmacies)} pharmacies ===")
-            for item in nearby_pharmacies:
-                pharmacy = item['pharmacy']
-                distance = item['distance']
-                
-                print(f"Sending to pharmacy_{pharmacy.id} (distance: {distance:.2f}km)")
-                
-                async_to_sync(channel_layer.group_send)(
-                    f"pharmacy_{pharmacy.id}",
-                    {
-                        'type': 'new_request',
-                        'request_id': medicine_request.id,
-                        'patient_name': request.user.name,
-                        'patient_phone': request.user.phone_number,
-                        'patient_location': {
-                            'lat': medicine_request.patient_lat,
-                            'lng': medicine_request.patient_lng
-                        },
-                        'distance_km': round(distance, 2),
-                        'quantity': medicine_request.quantity,
-                        'image_url': request.build_absolute_uri(medicine_request.image.url),
-                        'timestamp': medicine_request.created_at.isoformat()
-                    }
-                )
-            print("=== Broadcast complete ===\n")
-            
-            # ── FCM push (works even when app is killed) ──────────
-            notify_pharmacies_new_request(
-                nearby_pharmacies=nearby_pharmacies,
-                request_id=medicine_request.id,
-                patient_name=request.user.name,
-                quantity=medicine_request.quantity,
+
+            image_url = request.build_absolute_uri(medicine_request.image.url)
+            transaction.on_commit(
+                lambda: _queue_dispatch(medicine_request.id, image_url)
             )
 
+            # The number of pharmacies reached is reported once the task has
+            # sent to them, in the patient's request_dispatched WebSocket event
             return Response({
-                'message': f'Medicine request sent to {len(nearby_pharmacies)} nearby pharmacies',
+                'message': 'Medicine request received — notifying nearby pharmacies',
                 'request_id': medicine_request.id,
-                'pharmacies_notified': len(nearby_pharmacies),
                 'data': serializer.data
             }, status=status.HTTP_201_CREATED)
         
@@ -90,27 +66,24 @@ class MedicineRequestApiView(APIView):
             # If user is a pharmacy, get pending requests in their area
             pharmacy = request.user.pharmacy
 
-            all_pending = MedicineRequest.objects.filter(
-                status='PENDING'
-            ).select_related('patient')
-
-            # Exclude requests this pharmacy has already responded to so they
-            # don't re-appear in the pending list after a reject.
-            already_responded_ids = set(
-                PharmacyResponse.objects.filter(pharmacy=pharmacy)
-                .values_list('request_id', flat=True)
+            # Open requests in the cells around this pharmacy, excluding those it
+            # has already responded to so they don't re-appear after a reject.
+            open_requests = list(
+                MedicineRequest.pending_near(pharmacy.lat, pharmacy.lng)
+                .exclude(responses__pharmacy=pharmacy)
+                .select_related('patient')
             )
-
             nearby_requests = []
-            for req in all_pending:
-                if req.id in already_responded_ids:
-                    continue
-                distance = MedicineRequest.calculate_distance(
+            if open_requests:
+                distances = geo.distances_from(
                     pharmacy.lat, pharmacy.lng,
-                    req.patient_lat, req.patient_lng
+                    [req.patient_lat for req in open_requests],
+                    [req.patient_lng for req in open_requests],
                 )
-                if distance <= req.radius_km:
-                    nearby_requests.append(req)
+                radii = np.fromiter((req.radius_km for req in open_requests), dtype=float)
+                nearby_requests = [
+                    open_requests[i] for i in np.flatnonzero(distances <= radii)
+                ]
 
             # Requests this pharmacy has accepted or responded to
             history_requests = MedicineRequest.objects.filter(
@@ -378,19 +351,20 @@ class PatientSelectPharmacyView(APIView):
             }
         )
 
-        # Notify all other nearby pharmacies that the request is no longer available
-        nearby_pharmacies = medicine_request.get_nearby_pharmacies()
-        for item in nearby_pharmacies:
-            other_pharmacy = item['pharmacy']
-            if other_pharmacy.id != selected_pharmacy.id:
-                async_to_sync(channel_layer.group_send)(
-                    f"pharmacy_{other_pharmacy.id}",
-                    {
-                        'type': 'request_taken',
-                        'request_id': medicine_request.id,
-                        'message': 'This request has been accepted by another pharmacy',
-                    }
-                )
+        # Notify all other pharmacies that were pinged that the request is no longer available
+        nearby_pharmacies = medicine_request.get_recipients()
+        group_send_many(
+            (
+                f"pharmacy_{item['pharmacy'].id}",
+                {
+                    'type': 'request_taken',
+                    'request_id': medicine_request.id,
+                    'message': 'This request has been accepted by another pharmacy',
+                },
+            )
+            for item in nearby_pharmacies
+            if item['pharmacy'].id != selected_pharmacy.id
+        )
 
         # ── FCM push (works even when app is killed) ──────────────
         notify_pharmacy_selected(
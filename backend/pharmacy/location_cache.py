@@ -0,0 +1,204 @@
+"""
+Process-local snapshot of pharmacy locations for the ping hot path.
+
+Pharmacy coordinates change rarely but are read on every medicine request,
+so each worker keeps an array-backed copy of
+
+    (pharmacy_id, user_id, lat, lng)
+
+sorted by latitude. Nearby lookups binary-search the latitude band, mask the
+longitude band and score the survivors with the vectorised haversine — no
+database round trip.
+
+Freshness:
+- post_save / post_delete on Pharmacy (pharmacy.signals) call
+  ``invalidate()``, which marks this process's snapshot stale and publishes
+  on a Redis channel once the transaction commits.
+- Every process runs a small subscriber thread on that channel and marks its
+  own snapshot stale when a message arrives, so all ASGI / Celery workers
+  rebuild on their next read.
+- As a safety net the snapshot is rebuilt anyway once it is older than
+  PHARMACY_LOCATION_CACHE_MAX_AGE seconds (e.g. if Redis was unreachable).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from utils import geo
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_snapshot: PharmacySnapshot | None = None
+_stale = True
+_subscriber: threading.Thread | None = None
+
+# Seconds to wait before reconnecting the subscriber after a Redis error
+_RESUBSCRIBE_DELAY = 30
+
+
+@dataclass(frozen=True)
+class PharmacySnapshot:
+    """Immutable column arrays, all sorted by ``lats``."""
+    pharmacy_ids: np.ndarray
+    user_ids: np.ndarray
+    lats: np.ndarray
+    lngs: np.ndarray
+    built_at: float
+
+    def __len__(self) -> int:
+        return len(self.pharmacy_ids)
+
+    def nearby(self, lat: float, lng: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (row_indices, distances_km) of pharmacies within ``radius_km``,
+        ordered nearest first. Index into the snapshot arrays with the rows.
+        """
+        min_lat, max_lat, min_lng, max_lng = geo.bounding_box(lat, lng, radius_km)
+        lo = np.searchsorted(self.lats, min_lat, side='left')
+        hi = np.searchsorted(self.lats, max_lat, side='right')
+        if lo == hi:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        band = np.arange(lo, hi)
+        band_lngs = self.lngs[lo:hi]
+        band = band[(band_lngs >= min_lng) & (band_lngs <= max_lng)]
+        if not len(band):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        distances = geo.distances_from(lat, lng, self.lats[band], self.lngs[band])
+        keep = distances <= radius_km
+        rows, distances = band[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return rows[order], distances[order]
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'PHARMACY_LOCATION_CACHE_ENABLED', True)
+
+
+def get_snapshot() -> PharmacySnapshot:
+    """Return the current snapshot, rebuilding it first if it is stale."""
+    _ensure_subscriber()
+
+    snapshot = _snapshot
+    max_age = getattr(settings, 'PHARMACY_LOCATION_CACHE_MAX_AGE', 300)
+    if snapshot is not None and not _stale and time.monotonic() - snapshot.built_at < max_age:
+        return snapshot
+
+    with _lock:
+        # Another thread may have rebuilt while we waited for the lock
+        snapshot = _snapshot
+        if snapshot is not None and not _stale and time.monotonic() - snapshot.built_at < max_age:
+            return snapshot
+        return _rebuild()
+
+
+def refresh() -> PharmacySnapshot:
+    """Rebuild the snapshot for this process right now."""
+    with _lock:
+        return _rebuild()
+
+
+def invalidate() -> None:
+    """
+    Mark the snapshot stale here and in every other worker once the current
+    transaction commits (immediately when not in a transaction).
+    """
+    transaction.on_commit(_invalidate_everywhere)
+
+
+def _invalidate_everywhere() -> None:
+    _mark_stale()
+    _publish()
+
+
+def _mark_stale() -> None:
+    global _stale
+    _stale = True
+
+
+def _rebuild() -> PharmacySnapshot:
+    global _snapshot, _stale
+    from pharmacy.models import Pharmacy
+
+    # Clear the flag before reading so an invalidation that lands mid-build
+    # forces another rebuild on the next read.
+    _stale = False
+    rows = list(
+        Pharmacy.objects.order_by('lat')
+        .values_list('id', 'user_id', 'lat', 'lng')
+    )
+    if rows:
+        ids, user_ids, lats, lngs = zip(*rows)
+    else:
+        ids = user_ids = lats = lngs = ()
+
+    snapshot = PharmacySnapshot(
+        pharmacy_ids=np.array(ids, dtype=np.int64),
+        user_ids=np.array(user_ids, dtype=np.int64),
+        lats=np.array(lats, dtype=np.float64),
+        lngs=np.array(lngs, dtype=np.float64),
+        built_at=time.monotonic(),
+    )
+    _snapshot = snapshot
+    logger.info("Rebuilt pharmacy location snapshot (%d pharmacies)", len(snapshot))
+    return snapshot
+
+
+# ─── Cross-process invalidation over Redis pub/sub ───────────────────────────
+
+def _redis_client():
+    import redis
+    return redis.Redis.from_url(
+        settings.PHARMACY_LOCATION_CACHE_REDIS_URL,
+        socket_connect_timeout=1,
+    )
+
+
+def _channel() -> str:
+    return getattr(settings, 'PHARMACY_LOCATION_CACHE_CHANNEL', 'pharmacy-location-cache')
+
+
+def _publish() -> None:
+    try:
+        _redis_client().publish(_channel(), 'invalidate')
+    except Exception as e:
+        logger.warning("Could not publish pharmacy cache invalidation: %s", e)
+
+
+def _ensure_subscriber() -> None:
+    global _subscriber
+    if _subscriber is not None:
+        return
+    with _lock:
+        if _subscriber is None:
+            _subscriber = threading.Thread(
+                target=_listen, name='pharmacy-location-cache', daemon=True,
+            )
+            _subscriber.start()
+
+
+def _listen() -> None:
+    reconnecting = False
+    while True:
+        try:
+            pubsub = _redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(_channel())
+            if reconnecting:
+                # Anything published while we were disconnected is lost
+                _mark_stale()
+            reconnecting = True
+            for _message in pubsub.listen():
+                _mark_stale()
+        except Exception as e:
+            reconnecting = True
+            logger.warning("Pharmacy cache subscriber error, retrying in %ds: %s", _RESUBSCRIBE_DELAY, e)
+            time.sleep(_RESUBSCRIBE_DELAY)
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-16 09:12
+
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    from utils.geo import encode_geohash
+
+    Pharmacy = apps.get_model('pharmacy', 'Pharmacy')
+    pharmacies = list(Pharmacy.objects.only('id', 'lat', 'lng'))
+    for pharmacy in pharmacies:
+        pharmacy.geohash = encode_geohash(pharmacy.lat, pharmacy.lng)
+    Pharmacy.objects.bulk_update(pharmacies, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0004_pharmacydocument_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pharmacy',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 
 from accounts.models import CustomUser
+from utils.geo import encode_geohash
 
 # Create your models here.
 
@@ -12,9 +13,18 @@ class Pharmacy(models.Model):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     lat = models.FloatField(default=26.6646)
     lng = models.FloatField(default=87.2718)
+    # Geohash of (lat, lng) — lets nearby-pharmacy lookups use an index scan
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        self.geohash = encode_geohash(self.lat, self.lng)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'lat', 'lng'} & set(update_fields)):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name or 'Pharmacy'} - {self.user.email}"
 
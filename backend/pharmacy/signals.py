@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from pharmacy import location_cache
+from pharmacy.models import Pharmacy
+
+
+@receiver([post_save, post_delete], sender=Pharmacy)
+def invalidate_pharmacy_location_cache(sender, **kwargs):
+    """Location may have changed — rebuild snapshots everywhere."""
+    location_cache.invalidate()
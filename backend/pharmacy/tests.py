@@ -1,3 +1,158 @@
-from django.test import TestCase
+import itertools
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from accounts.models import CustomUser
+from medicine.models import MedicineRequest
+from pharmacy import location_cache
+from pharmacy.models import Pharmacy
+from utils import geo
+
+# Kathmandu; one degree of latitude is ~111 km
+LAT, LNG = 27.7172, 85.3240
+
+
+def make_pharmacy(index, lat=LAT, lng=LNG):
+    user = CustomUser.objects.create(
+        username=f'pharmacy-{index}', email=f'pharmacy-{index}@example.invalid',
+        name=f'Pharmacy {index}', phone_number='9800000300', role='PHARMACY',
+    )
+    return Pharmacy.objects.create(user=user, lat=lat, lng=lng)
+
+
+class GeohashTests(TestCase):
+
+    def test_encode_geohash(self):
+        # Reference value from the geohash specification
+        self.assertEqual(geo.encode_geohash(57.64911, 10.40744, precision=11), 'u4pruydqqvj')
+        self.assertEqual(geo.encode_geohash(57.64911, 10.40744), 'u4pruydqq')
+
+    def test_covering_cells_contain_every_point_in_range(self):
+        for radius_km in (0.5, 3, 10):
+            with self.subTest(radius_km=radius_km):
+                cells = geo.covering_cells(LAT, LNG, radius_km)
+                self.assertLessEqual(len(cells), geo.MAX_COVERING_CELLS)
+
+                min_lat, max_lat, min_lng, max_lng = geo.bounding_box(LAT, LNG, radius_km)
+                steps = [i / 20 for i in range(21)]
+                for lat_step, lng_step in itertools.product(steps, steps):
+                    lat = min_lat + (max_lat - min_lat) * lat_step
+                    lng = min_lng + (max_lng - min_lng) * lng_step
+                    if geo.haversine_km(LAT, LNG, lat, lng) > radius_km:
+                        continue
+                    point = geo.encode_geohash(lat, lng)
+                    self.assertTrue(any(point.startswith(cell) for cell in cells), (lat, lng, cells))
+
+    def test_covering_cells_give_up_across_the_antimeridian(self):
+        self.assertIsNone(geo.covering_cells(0.0, 179.99, 10))
+
+    def test_cell_filter_matches_whole_prefix_only(self):
+        inside_first, inside_last, before, after = (
+            make_pharmacy(i) for i in range(4)
+        )
+        for pharmacy, geohash in (
+            (inside_first, 'tuv000000'),
+            (inside_last, 'tuvzzzzzz'),
+            (before, 'tuuzzzzzz'),
+            (after, 'tuw000000'),
+        ):
+            Pharmacy.objects.filter(pk=pharmacy.pk).update(geohash=geohash)
+
+        matched = set(Pharmacy.objects.filter(geo.cell_filter(['tuv'])))
+
+        self.assertEqual(matched, {inside_first, inside_last})
+
+    def test_save_keeps_geohash_in_step(self):
+        pharmacy = make_pharmacy(0)
+        self.assertEqual(pharmacy.geohash, geo.encode_geohash(LAT, LNG))
+
+        pharmacy.lat = LAT + 1
+        pharmacy.save(update_fields=['lat'])
+
+        pharmacy.refresh_from_db()
+        self.assertEqual(pharmacy.geohash, geo.encode_geohash(LAT + 1, LNG))
+
+    def test_distances_from_matches_scalar_haversine(self):
+        lats = [LAT, LAT + 0.1, LAT - 2.5, -LAT]
+        lngs = [LNG, LNG - 0.3, LNG + 1.0, LNG - 180]
+
+        distances = geo.distances_from(LAT, LNG, lats, lngs)
+
+        self.assertEqual(distances.shape, (4,))
+        for distance, lat, lng in zip(distances, lats, lngs):
+            self.assertAlmostEqual(distance, geo.haversine_km(LAT, LNG, lat, lng), places=6)
+
+
+@override_settings(PHARMACY_LOCATION_CACHE_ENABLED=False)
+class NearbyPharmacyTests(TestCase):
+
+    def test_matches_a_full_scan_nearest_first(self):
+        # Pharmacies 1-12 km out in eight directions, some either side of the radius
+        pharmacies = [
+            make_pharmacy(i, LAT + km * dlat / geo.KM_PER_DEGREE, LNG + km * dlng / geo.KM_PER_DEGREE)
+            for i, (km, (dlat, dlng)) in enumerate(itertools.product(
+                (1, 4.9, 5.1, 12),
+                ((1, 0), (-1, 0), (0, 1), (0, -1), (0.7, 0.7), (-0.7, 0.7), (0.7, -0.7), (-0.7, -0.7)),
+            ))
+        ]
+        request = MedicineRequest(patient_lat=LAT, patient_lng=LNG, radius_km=5)
+
+        nearby = request.get_nearby_pharmacies()
+
+        in_range = {p for p in pharmacies if geo.haversine_km(LAT, LNG, p.lat, p.lng) <= 5}
+        self.assertEqual({item['pharmacy'] for item in nearby}, in_range)
+        distances = [item['distance'] for item in nearby]
+        self.assertEqual(distances, sorted(distances))
+        for item in nearby:
+            self.assertAlmostEqual(
+                item['distance'], geo.haversine_km(LAT, LNG, item['pharmacy'].lat, item['pharmacy'].lng),
+            )
+
+
+@override_settings(PHARMACY_LOCATION_CACHE_ENABLED=True)
+class LocationSnapshotTests(TestCase):
+
+    def setUp(self):
+        # No Redis here: keep invalidation process-local
+        for name in ('_publish', '_ensure_subscriber'):
+            patcher = mock.patch.object(location_cache, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(location_cache._mark_stale)
+
+    def test_snapshot_agrees_with_database_lookup(self):
+        for i, (dlat, dlng) in enumerate(itertools.product((-0.06, -0.01, 0.02, 0.2), (-0.05, 0.0, 0.03))):
+            make_pharmacy(i, LAT + dlat, LNG + dlng)
+        location_cache.refresh()
+        request = MedicineRequest(patient_lat=LAT, patient_lng=LNG, radius_km=6)
+
+        from_snapshot = request.get_nearby_pharmacies()
+        from_database = request._nearby_from_database()
+
+        self.assertTrue(from_snapshot)
+        self.assertEqual(
+            [(item['pharmacy'], round(item['distance'], 9)) for item in from_snapshot],
+            [(item['pharmacy'], round(item['distance'], 9)) for item in from_database],
+        )
+
+    def test_save_and_delete_invalidate_after_commit(self):
+        location_cache.refresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pharmacy = make_pharmacy(0)
+        self.assertIn(pharmacy.id, location_cache.get_snapshot().pharmacy_ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pharmacy.delete()
+        self.assertNotIn(pharmacy.id, location_cache.get_snapshot().pharmacy_ids)
+        location_cache._publish.assert_called()
+
+    def test_invalidation_waits_for_commit(self):
+        location_cache.refresh()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            make_pharmacy(0)
+            self.assertEqual(len(location_cache.get_snapshot()), 0)
+
+        self.assertEqual(len(callbacks), 1)
@@ -0,0 +1,50 @@
+"""
+Batched channel-layer fan-out.
+
+Calling ``async_to_sync(channel_layer.group_send)`` once per recipient pays
+a sync→async hop and a separate Redis round trip each time, so the cost of a
+broadcast grows linearly with the number of recipients. ``group_send_many``
+enters the event loop once and issues every group_send concurrently, so the
+round trips overlap instead of queueing up behind each other.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Iterable
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def group_send_many(messages: Iterable[tuple[str, dict]], channel_layer=None) -> list[bool]:
+    """
+    Send each ``(group_name, message)`` pair in a single async context.
+
+    A failure for one group is logged and does not stop the others.
+    Returns one success flag per message, in input order.
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+
+    channel_layer = channel_layer or get_channel_layer()
+    return async_to_sync(_send_all)(channel_layer, messages)
+
+
+async def _send_all(channel_layer, messages: list[tuple[str, dict]]) -> list[bool]:
+    results = await asyncio.gather(
+        *(channel_layer.group_send(group, message) for group, message in messages),
+        return_exceptions=True,
+    )
+
+    delivered = []
+    for (group, _message), result in zip(messages, results):
+        if isinstance(result, Exception):
+            logger.error("group_send to %s failed: %s", group, result)
+            delivered.append(False)
+        else:
+            delivered.append(True)
+    return delivered
@@ -21,6 +21,9 @@ import os
 
 _firebase_initialized = False
 
+# FCM accepts at most 500 messages / tokens per batch call
+FCM_BATCH_LIMIT = 500
+
 
 # ─── Custom exception ────────────────────────────────────────────────────────
 
@@ -177,7 +180,8 @@ def send_multicast_notification(
     data: dict | None = None,
 ) -> dict:
     """
-    Send a push notification to multiple devices in a single FCM call.
+    Send a push notification to multiple devices, one FCM call per
+    FCM_BATCH_LIMIT tokens.
 
     Returns:
         {
@@ -194,43 +198,121 @@ def send_multicast_notification(
     if not tokens:
         return {'success_count': 0, 'failure_count': 0, 'failed_tokens': []}
 
-    try:
-        message = messaging.MulticastMessage(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            data=_stringify_data(data),
-            tokens=tokens,
-            android=_build_android_config(),
-            apns=_build_apns_config(),
-        )
+    success_count = 0
+    failure_count = 0
+    failed_tokens: list[str] = []
+
+    for start in range(0, len(tokens), FCM_BATCH_LIMIT):
+        batch = tokens[start:start + FCM_BATCH_LIMIT]
+        try:
+            message = messaging.MulticastMessage(
+                notification=messaging.Notification(
+                    title=title,
+                    body=body,
+                ),
+                data=_stringify_data(data),
+                tokens=batch,
+                android=_build_android_config(),
+                apns=_build_apns_config(),
+            )
+
+            # send_each_for_multicast gives per-token results (firebase-admin >= 6.0)
+            response = messaging.send_each_for_multicast(message)
+
+            for idx, result in enumerate(response.responses):
+                if not result.success:
+                    if isinstance(result.exception, messaging.UnregisteredError):
+                        failed_tokens.append(batch[idx])
+                    else:
+                        print(f"FCM multicast error for token {batch[idx]}: {result.exception}")
+            success_count += response.success_count
+            failure_count += response.failure_count
+
+        except Exception as e:
+            print(f"FCM multicast error: {str(e)}")
+            failure_count += len(batch)
+
+    print(
+        f"FCM multicast: {success_count} sent, "
+        f"{failure_count} failed, "
+        f"{len(failed_tokens)} unregistered"
+    )
+    return {
+        'success_count': success_count,
+        'failure_count': failure_count,
+        'failed_tokens': failed_tokens,
+    }
+
+
+# ─── Batched per-device send ─────────────────────────────────────────────────
+
+def send_each_notification(notifications: list[dict]) -> dict:
+    """
+    Send individually addressed notifications in as few FCM calls as possible.
+
+    Unlike multicast, every item may carry its own title / body / data, so one
+    batch can fan out personalised messages (e.g. a distance per pharmacy).
 
-        # send_each_for_multicast gives per-token results (firebase-admin >= 6.0)
-        response = messaging.send_each_for_multicast(message)
+    Args:
+        notifications: list of {'token', 'title', 'body', 'data'} dicts.
+
+    Returns:
+        {
+            'success_count': int,
+            'failure_count': int,
+            'failed_tokens': list[str],   # tokens FCM says are no longer registered
+            'results': list[bool],        # per notification, in input order
+        }
+    """
+    if not _firebase_initialized:
+        raise Exception("Firebase not initialized. Call initialize_firebase() first.")
 
-        failed_tokens: list[str] = []
-        for idx, result in enumerate(response.responses):
+    results: list[bool] = []
+    failed_tokens: list[str] = []
+
+    for start in range(0, len(notifications), FCM_BATCH_LIMIT):
+        batch = notifications[start:start + FCM_BATCH_LIMIT]
+        messages = [
+            messaging.Message(
+                notification=messaging.Notification(
+                    title=item['title'],
+                    body=item['body'],
+                ),
+                data=_stringify_data(item.get('data')),
+                token=item['token'],
+                android=_build_android_config(),
+                apns=_build_apns_config(),
+            )
+            for item in batch
+        ]
+
+        try:
+            response = messaging.send_each(messages)
+        except Exception as e:
+            print(f"FCM send_each error: {str(e)}")
+            results.extend([False] * len(batch))
+            continue
+
+        for item, result in zip(batch, response.responses):
+            results.append(result.success)
             if not result.success:
                 if isinstance(result.exception, messaging.UnregisteredError):
-                    failed_tokens.append(tokens[idx])
+                    failed_tokens.append(item['token'])
                 else:
-                    print(f"FCM multicast error for token {tokens[idx]}: {result.exception}")
-
-        print(
-            f"FCM multicast: {response.success_count} sent, "
-            f"{response.failure_count} failed, "
-            f"{len(failed_tokens)} unregistered"
-        )
-        return {
-            'success_count': response.success_count,
-            'failure_count': response.failure_count,
-            'failed_tokens': failed_tokens,
-        }
+                    print(f"FCM send_each error for token {item['token']}: {result.exception}")
 
-    except Exception as e:
-        print(f"FCM multicast error: {str(e)}")
-        return {'success_count': 0, 'failure_count': len(tokens), 'failed_tokens': []}
+    success_count = sum(results)
+    print(
+        f"FCM send_each: {success_count} sent, "
+        f"{len(results) - success_count} failed, "
+        f"{len(failed_tokens)} unregistered"
+    )
+    return {
+        'success_count': success_count,
+        'failure_count': len(results) - success_count,
+        'failed_tokens': failed_tokens,
+        'results': results,
+    }
 
 
 # ─── Status check ─────────────────────────────────────────────────────────────
@@ -0,0 +1,193 @@
+"""
+Geospatial helpers shared by the medicine broadcast pipeline.
+
+Pharmacies (and anything else with a lat/lng) carry a geohash cell string so
+that "who is near this point?" can be answered with a handful of indexed
+range scans instead of a full-table haversine loop:
+
+1. ``bounding_box()`` turns (lat, lng, radius_km) into a lat/lng rectangle.
+2. ``covering_cells()`` returns the geohash prefixes that cover that rectangle.
+3. ``cell_filter()`` builds a Q object matching any of those prefixes using
+   plain ``>=`` / ``<`` comparisons, which every database can serve from a
+   B-tree index on the geohash column.
+4. Exact distances are then computed only for the rows that survive.
+
+Distance scoring is vectorised with NumPy: ``distances_from()`` scores one
+point against N coordinates and ``distance_matrix()`` scores M×N pairs, so
+callers never loop over rows in Python to run the haversine formula.
+"""
+from __future__ import annotations
+
+import math
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0
+
+# One degree of latitude in kilometres (constant everywhere on the sphere).
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+# Precision stored on rows. 9 chars ≈ 4.8m × 4.8m — far finer than any query.
+GEOHASH_PRECISION = 9
+
+# Upper bound on prefixes per query; keeps the OR'ed range scans cheap.
+MAX_COVERING_CELLS = 16
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Sorts after every geohash character — used as an exclusive prefix upper bound.
+_PREFIX_END = '~'
+
+
+def encode_geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode a coordinate as a geohash string of the given precision."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_lo = mid
+            else:
+                bits <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision: int) -> tuple[float, float]:
+    """Return the (lat_height, lng_width) of a geohash cell in degrees."""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> tuple[float, float, float, float]:
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle of
+    ``radius_km`` around the point. Longitude span is widened to the full
+    globe when the circle reaches a pole.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat = max(lat - dlat, -90.0)
+    max_lat = min(lat + dlat, 90.0)
+
+    # Widest longitude reached by the circle (larger than dlat / cos(lat))
+    sin_ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+    if sin_ratio >= 1.0 or min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    dlng = math.degrees(math.asin(sin_ratio))
+    return min_lat, max_lat, lng - dlng, lng + dlng
+
+
+def covering_cells(lat: float, lng: float, radius_km: float) -> list[str] | None:
+    """
+    Return geohash prefixes that together cover the search circle, using the
+    finest precision that needs at most ``MAX_COVERING_CELLS`` prefixes.
+
+    Returns None when the box wraps the antimeridian or the whole globe;
+    callers should fall back to a plain bounding-box filter in that case.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    if min_lng < -180.0 or max_lng > 180.0:
+        return None
+    if min_lng == -180.0 and max_lng == 180.0:
+        return None
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_h, cell_w = cell_size_degrees(precision)
+        rows = math.floor(max_lat / cell_h) - math.floor(min_lat / cell_h) + 1
+        cols = math.floor(max_lng / cell_w) - math.floor(min_lng / cell_w) + 1
+        if rows * cols > MAX_COVERING_CELLS:
+            continue
+
+        cells = set()
+        row_lat = min_lat
+        for _ in range(rows):
+            col_lng = min_lng
+            for _ in range(cols):
+                cells.add(encode_geohash(row_lat, col_lng, precision))
+                col_lng = min(col_lng + cell_w, max_lng)
+            row_lat = min(row_lat + cell_h, max_lat)
+        return sorted(cells)
+
+    return None
+
+
+def cell_filter(cells: list[str], field: str = 'geohash') -> Q:
+    """
+    Build a Q matching rows whose ``field`` starts with any of ``cells``.
+
+    Expressed as ranges rather than ``__startswith`` so the lookup is served
+    by an ordinary B-tree index on every backend.
+    """
+    return reduce(or_, (
+        Q(**{f'{field}__gte': cell, f'{field}__lt': cell + _PREFIX_END})
+        for cell in cells
+    ))
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two coordinates in kilometres."""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lng = math.radians(lng2 - lng1)
+
+    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def distances_from(lat: float, lng: float, lats, lngs) -> np.ndarray:
+    """
+    Haversine distance in km from one point to each of N coordinates.
+
+    ``lats`` / ``lngs`` may be any array-like of floats; returns an array of
+    shape (N,).
+    """
+    return distance_matrix([lat], [lng], lats, lngs)[0]
+
+
+def distance_matrix(lats1, lngs1, lats2, lngs2) -> np.ndarray:
+    """
+    Haversine distance in km for every pair of M origins × N targets.
+
+    Returns an array of shape (M, N) where ``[i, j]`` is the distance from
+    origin ``i`` to target ``j``.
+    """
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, np.newaxis]
+    lng1 = np.radians(np.asarray(lngs1, dtype=np.float64))[:, np.newaxis]
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))[np.newaxis, :]
+    lng2 = np.radians(np.asarray(lngs2, dtype=np.float64))[np.newaxis, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    # clip guards against a creeping just past 1.0 from float rounding
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,40 @@
+"""
+Memoized timezone lookups for the reminder hot paths.
+
+Alarms store their timezone by name and the scheduler touches thousands of
+them per run, so resolving ``ZoneInfo(name)`` and formatting the same
+"08:00 AM" label over and over adds up. ``get_timezone()`` resolves each
+name once per process and ``local_time_label()`` caches the rendered label
+per (timezone, minute).
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str) -> ZoneInfo:
+    """
+    Return the ZoneInfo for an IANA name, resolved once per process.
+
+    Raises zoneinfo.ZoneInfoNotFoundError for unknown names (not cached).
+    """
+    return ZoneInfo(name)
+
+
+def localize(naive: datetime, name: str) -> datetime:
+    """Attach the named timezone to a naive local datetime."""
+    return naive.replace(tzinfo=get_timezone(name))
+
+
+def local_time_label(value: datetime, name: str) -> str:
+    """Format an aware datetime as e.g. '08:00 AM' in the named timezone."""
+    return _minute_label(name, int(value.timestamp()) // 60)
+
+
+@lru_cache(maxsize=4096)
+def _minute_label(name: str, epoch_minute: int) -> str:
+    utc = datetime.fromtimestamp(epoch_minute * 60, tz=dt_timezone.utc)
+    return utc.astimezone(get_timezone(name)).strftime('%I:%M %p')
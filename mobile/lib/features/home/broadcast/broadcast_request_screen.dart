@@ -208,7 +208,6 @@ class _BroadcastRequestScreenState extends State<BroadcastRequestScreen> {
         imageFile: File(_prescription!.path),
       );
 
-      final pharmaciesNotified = result['pharmacies_notified'] ?? 0;
       final message = result['message'] as String? ?? 'Broadcast sent!';
 
       if (mounted) {
@@ -217,11 +216,7 @@ class _BroadcastRequestScreenState extends State<BroadcastRequestScreen> {
 
         ScaffoldMessenger.of(context).showSnackBar(
           SnackBar(
-            content: Text(
-              pharmaciesNotified > 0
-                  ? '$message ($pharmaciesNotified pharmacies notified)'
-                  : message,
-            ),
+            content: Text(message),
             backgroundColor: AppColors.primary,
           ),
         );
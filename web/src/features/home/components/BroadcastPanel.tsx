@@ -221,7 +221,7 @@ export default function BroadcastPanel({ radius, setRadius, location, geoLoading
       const res = await api.createMedicineRequest(formData);
       setBroadcastResult({
         success: true,
-        message: res.message ?? `Request sent to ${res.pharmacies_notified ?? 0} nearby pharmacies`,
+        message: res.message ?? 'Request received — notifying nearby pharmacies',
       });
 
       // Activate the offers panel — clears previous offers and sets the request ID